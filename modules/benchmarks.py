@@ -0,0 +1,293 @@
+"""
+Benchmarks für die Datenaufbereitung
+
+Aufruf: python -m modules.benchmarks
+"""
+
+import datetime
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from scipy import signal
+
+from modules import df_manip as dfm
+from modules import fig_payload as payload
+from modules import fig_update_anno as fuan
+from modules import plotly_plots as ploplo
+
+
+def timeit(func: Any, *args, repeat: int = 3, **kwargs) -> float:
+    """beste Laufzeit (in Sekunden) aus mehreren Durchläufen"""
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start_time)
+
+    return min(times)
+
+
+def profile_15min(years: int = 10, cols: int = 2, start: int = 2016) -> pd.DataFrame:
+    """synthetischer Lastgang in 15-Minuten-Auflösung"""
+    index = pd.date_range(
+        f"{start}-01-01 00:15",
+        f"{start + years}-01-01 00:00",
+        freq="15min",
+    )
+    rng = np.random.default_rng(42)
+
+    return pd.DataFrame(
+        rng.random((len(index), cols)) * 100,
+        index=index,
+        columns=[f"Linie {num}" for num in range(cols)],
+    )
+
+
+def bench_idx_date_time(years: int = 10) -> dict:
+    """Index aus Datum + Uhrzeit (datetime.time, Text und Excel-Zahl)"""
+
+    index = profile_15min(years, cols=1).index
+    dates = pd.Series(index.strftime("%Y-%m-%d"))
+    dic_times = {
+        "datetime.time": pd.Series(index.time),
+        "Text": pd.Series(index.strftime("%H:%M")),
+        "Excel-Zahl": pd.Series((index - index.normalize()) / pd.Timedelta(days=1)),
+    }
+
+    def old(dat: pd.Series, tim: pd.Series) -> pd.DatetimeIndex:
+        """Listen-Abstraktion über jede Zeile (bisherige Umsetzung)"""
+        return (
+            pd.to_datetime(dat.values, format="%Y-%m-%d")
+            + pd.to_timedelta([x.hour for x in tim.values], unit="hours")
+            + pd.to_timedelta([x.minute for x in tim.values], unit="minutes")
+        )
+
+    results = {
+        "Zeilen": len(index),
+        "bisher (datetime.time)": timeit(old, dates, dic_times["datetime.time"]),
+    }
+    for name, times in dic_times.items():
+        assert dfm.combine_date_time(dates, times).equals(index)
+        results[f"neu ({name})"] = timeit(dfm.combine_date_time, dates, times)
+
+    return results
+
+
+def bench_df_multi_y(years: int = 5) -> dict:
+    """mehrere Jahre auf 2020 legen"""
+
+    df = profile_15min(years, cols=2)
+    df["orgidx"] = df.index
+    lis_years = sorted(set(df.index.year))[:-1]
+
+    def old(df: pd.DataFrame) -> dict:
+        """Timestamp.replace für jeden Zeitstempel (bisherige Umsetzung)"""
+        dic_df = {}
+        for year in lis_years:
+            dic_df[year] = df.loc[df.index.year == year, :].copy()
+            dic_df[year]["orgidx"] = df.loc[df.index.year == year, :].index
+            if year != 2020:
+                dic_df[year].index = [
+                    dic_df[year].index[x].replace(year=2020)
+                    for x in range(len(dic_df[year].index))
+                ]
+        return dic_df
+
+    dic_old, dic_new = old(df), dfm.fold_years(df, lis_years)
+    for year in lis_years:
+        assert (dic_old[year].index == dic_new[year].index).all()
+
+    return {
+        "Zeilen": len(df),
+        "bisher": timeit(old, df),
+        "neu": timeit(dfm.fold_years, df, lis_years),
+    }
+
+
+def meter_exports_12h(count: int = 20, days: int = 365) -> dict:
+    """Zählerexporte mit 12-Stunden-Uhr (ohne am / pm)"""
+    index = pd.date_range("2020-01-01", periods=days * 96, freq="15min")
+    stamps = index - pd.to_timedelta((index.hour >= 12) * 12, unit="h")
+
+    return {
+        f"Zähler {num}": pd.DataFrame({"Zeit": stamps, "Wert": float(num)})
+        for num in range(count)
+    }
+
+
+def bench_am_pm(count: int = 20) -> dict:
+    """12-Stunden-Uhr in 24 Stunden umwandeln (dictionary mit Zählerexporten)"""
+
+    def old(dic_df: dict, time_column: str = "Zeit") -> dict:
+        """bisherige Umsetzung (Differenzen mehrfach je df, np.select mit NaN)"""
+        for key in dic_df:
+            if any(dic_df[key][time_column].dt.hour.diff().values < 0) and any(
+                dic_df[key][time_column].dt.day.diff().values == 0
+            ):
+                conditions = [
+                    (dic_df[key][time_column].dt.day.diff().values > 0),
+                    (dic_df[key][time_column].dt.month.diff().values != 0),
+                    (dic_df[key][time_column].dt.year.diff().values != 0),
+                    (
+                        (dic_df[key][time_column].dt.hour.diff().values < 0)
+                        & (dic_df[key][time_column].dt.day.diff().values == 0)
+                    ),
+                ]
+                choices = [pd.Timedelta(0, "h")] * 3 + [pd.Timedelta(12, "h")]
+                offset = pd.Series(
+                    data=np.select(conditions, choices, default=np.nan),
+                    index=dic_df[key][time_column].index,
+                    dtype="timedelta64[ns]",
+                )
+                offset[0] = pd.Timedelta(0)
+                offset.fillna(method="ffill", inplace=True)
+                dic_df[key][time_column] += offset
+        return dic_df
+
+    dic_old = old(meter_exports_12h(count))
+    dic_new, lis_corrected = dfm.repair_12h(meter_exports_12h(count))
+    assert len(lis_corrected) == count
+    for key, df in dic_new.items():
+        assert df["Zeit"].equals(dic_old[key]["Zeit"])
+
+    dic_run = {"bisher": [], "neu": []}
+    for _ in range(3):
+        dic_run["bisher"].append(meter_exports_12h(count))
+        dic_run["neu"].append(meter_exports_12h(count))
+    runs_old, runs_new = iter(dic_run["bisher"]), iter(dic_run["neu"])
+
+    return {
+        "Zeilen": sum(len(df) for df in dic_new.values()),
+        "bisher": timeit(lambda: old(next(runs_old))),
+        "neu": timeit(lambda: dfm.repair_12h(next(runs_new))),
+    }
+
+
+def bench_append_products(years: int = 5) -> dict:
+    """Stunden-, Monatswerte und Jahresdauerlinie für eine angehängte Woche"""
+
+    df = profile_15min(years, cols=2)
+    dic_meta = {col: {"unit_data": " kWh"} for col in df.columns}
+    dic_meta["index"] = {"td_mean": pd.Timedelta(minutes=15)}
+    start = df.index[-7 * 96]
+
+    def full(df: pd.DataFrame) -> dict:
+        """alles neu berechnen"""
+        df_h, meta_upd = dfm.resample_h(df, dic_meta, dic_meta["index"]["td_mean"])
+        dic_meta_h = {**dic_meta, **meta_upd}
+        df_mon = dfm.resample_mon(df_h, dic_meta_h)
+        df_mon["orgidx"] = df_mon.index.copy()
+        return {
+            "df_h": df_h,
+            "df_mon": df_mon,
+            "df_jdl": dfm.jdl_batch({"df": df_h})["df"],
+        }
+
+    dic_products = full(df.loc[df.index < start])
+    dic_full = full(df)
+    dic_upd, _ = dfm.append_products(dic_products, df, dic_meta, start)
+    for name, df_full in dic_full.items():
+        assert dic_upd[name].equals(df_full)
+
+    return {
+        "Zeilen": len(df),
+        "neu berechnen": timeit(full, df),
+        "fortschreiben": timeit(dfm.append_products, dic_products, df, dic_meta, start),
+    }
+
+
+def bench_payload(years: int = 3, n_points: int | None = ploplo.MAX_POINTS) -> dict:
+    """Größe und Dauer der Übertragung einer Liniengrafik
+
+    JSON wie bisher und kodiert (fig_payload.encode)
+    """
+
+    df = profile_15min(years, cols=4)
+    df["orgidx"] = df.index
+    dic_meta = {
+        col: {"unit_graph": " kW", "tit": col, "y_axis": "y"} for col in df.columns
+    }
+    fig = ploplo.line_plot(df, dic_meta, title="Lastgang", n_points=n_points)
+
+    def chart(fig: go.Figure | dict) -> str:
+        """wie st.plotly_chart (dictionaries werden dort geprüft)"""
+        if isinstance(fig, dict):
+            fig = go.Figure(fig)
+        return pio.to_json(fig.to_dict(), validate=False)
+
+    def html(fig: go.Figure) -> str:
+        """html-Schnipsel ohne plotly.js (bisherige Umsetzung)"""
+        return fig.to_html(full_html=False, include_plotlyjs=False)
+
+    dic_payload = {
+        "bisher": chart(fig),
+        "kodiert": payload.to_json(fig),
+    }
+
+    return {
+        "Punkte": sum(len(trace.y) for trace in fig.data),
+        **{
+            f"Größe {name}": f"{len(text) / 1024**2:.2f} MB"
+            for name, text in dic_payload.items()
+        },
+        "plotly_chart bisher": timeit(chart, fig, repeat=1),
+        "plotly_chart kodiert": timeit(lambda: chart(payload.encode(fig)), repeat=1),
+        "JSON kodiert": timeit(payload.to_json, fig, repeat=1),
+        "html bisher": timeit(html, fig, repeat=1),
+        "html kodiert": timeit(
+            payload.to_html, fig, {}, include_plotlyjs=False, repeat=1
+        ),
+    }
+
+
+def bench_smooth(years: int = 3, cols: int = 8, window: int = 97) -> dict:
+    """Savitzky-Golay-Glättung mehrerer gleich langer Linien (mit Lücken)"""
+
+    arr = profile_15min(years, cols=cols).to_numpy().T.copy()
+    arr[:, 1000:1010] = np.nan
+
+    def old(arr: np.ndarray) -> list:
+        """jede Linie einzeln (bisherige Umsetzung)"""
+        return [
+            signal.savgol_filter(
+                x=pd.Series(row).interpolate("akima"),
+                mode="mirror",
+                window_length=window,
+                polyorder=3,
+            )
+            for row in arr
+        ]
+
+    assert np.allclose(np.array(old(arr)), fuan.savgol_rows(arr, window, 3))
+
+    return {
+        "Punkte": arr.size,
+        "bisher": timeit(old, arr),
+        "neu": timeit(fuan.savgol_rows, arr, window, 3),
+    }
+
+
+BENCHMARKS = {
+    "idx_date_time": bench_idx_date_time,
+    "df_multi_y": bench_df_multi_y,
+    "am_pm": bench_am_pm,
+    "append_products": bench_append_products,
+    "payload": bench_payload,
+    "payload (alle Punkte)": lambda: bench_payload(n_points=0),
+    "smooth": bench_smooth,
+}
+
+
+if __name__ == "__main__":
+    for bench_name, bench in BENCHMARKS.items():
+        print(f"{bench_name} ({datetime.datetime.now():%H:%M:%S})")
+        for key, val in bench().items():
+            print(
+                f"    {key}: {val:.4f} s"
+                if isinstance(val, float)
+                else f"    {key}: {val}"
+            )
@@ -13,6 +13,8 @@ import streamlit as st
 from github import Github
 from pytz import timezone
 
+from modules import obis
+
 
 # timer decorator
 def timer() -> None:
@@ -150,6 +152,9 @@ LIS_UNITS: list = [
     "t",
 ]
 
+# Einheiten in Kleinbuchstaben für die Suche in Tabellen (df_manip.find_units)
+SET_UNITS_LOW: frozenset = frozenset(unit.lower() for unit in LIS_UNITS)
+
 # Einheiten, bei denen der Mittelwert gebildet werden muss (statt Summe)
 GRP_MEAN: list = [
     " °c",
@@ -215,9 +220,7 @@ PLOTFARBE: dict = {
 }
 
 
-# obis Elektrizität (Medium == 1)
-OBIS_PATTERN_EL: str = "*1-*:*.*"
-
+# obis Elektrizität (Medium == 1) - Erkennung in modules/obis.py
 DIC_OBIS_EL_KEY: dict = {
     "Medium": {"1": "Elektrizität"},
     "Messgröße": {
@@ -538,27 +541,16 @@ DIC_OBIS_EL_KEY: dict = {
 def trans_obis(code: str) -> dict:
     """Parameter Name und Einheit aus obis-code"""
     dic_obis = {"name": code, "name_lang": code, "unit": ""}
-    code_r = code.replace(":", "-").replace(".", "-").replace("~*", "-")
-    lis_code = code_r.split("-")
-    code_medium = lis_code[0] if lis_code else None
-    code_messgr = lis_code[2] if len(lis_code) >= 3 else None
-    code_messart = lis_code[3] if len(lis_code) >= 4 else None
-
-    if code_medium == "1" and code_messgr:
-        dic_obis["name_kurz"] = DIC_OBIS_EL_KEY["Messgröße"][code_messgr]["alt_bez"]
-        dic_obis["name"] = (
-            DIC_OBIS_EL_KEY["Messgröße"][code_messgr]["alt_bez"] + " (" + code + ")"
-        )
+    obis_code = obis.parse(code)
+
+    if obis_code and obis_code.medium == obis.MEDIUM_EL:
+        messgr = DIC_OBIS_EL_KEY["Messgröße"][obis_code.messgr]
+        messart = DIC_OBIS_EL_KEY["Messart"][obis_code.messart]
+        dic_obis["name_kurz"] = messgr["alt_bez"]
+        dic_obis["name"] = f'{messgr["alt_bez"]} ({code})'
         dic_obis["name_lang"] = (
-            DIC_OBIS_EL_KEY["Messgröße"][code_messgr]["bez"]
-            + " ["
-            + DIC_OBIS_EL_KEY["Messgröße"][code_messgr]["unit"]
-            + "] - "
-            + DIC_OBIS_EL_KEY["Messart"][code_messart]["bez"]
-            + " ("
-            + code
-            + ")"
+            f'{messgr["bez"]} [{messgr["unit"]}] - {messart["bez"]} ({code})'
         )
-        dic_obis["unit"] = DIC_OBIS_EL_KEY["Messgröße"][code_messgr]["unit"]
+        dic_obis["unit"] = messgr["unit"]
 
     return dic_obis
@@ -2,13 +2,76 @@
 Bearbeitung der Daten
 """
 
-from fnmatch import fnmatch
+import calendar
+import datetime
+from functools import lru_cache
+from typing import Any
 
 import numpy as np
 import pandas as pd
 import streamlit as st
+from scipy import interpolate
 
 from modules import def_dics as dics
+from modules import obis
+from modules import session_store as sst
+
+
+def _unique_time_of_day(val: Any) -> pd.Timedelta:
+    """einzelne Uhrzeit (datetime.time, Text, Excel-Zahl...) als Zeit seit Mitternacht"""
+    if isinstance(val, datetime.time):
+        return pd.Timedelta(
+            hours=val.hour,
+            minutes=val.minute,
+            seconds=val.second,
+            microseconds=val.microsecond,
+        )
+    if isinstance(val, (datetime.datetime, pd.Timestamp)):
+        return pd.Timestamp(val) - pd.Timestamp(val).normalize()
+    if isinstance(val, (datetime.timedelta, np.timedelta64)):
+        return pd.Timedelta(val)
+    if isinstance(val, (int, float, np.number)):
+        # Excel: Bruchteil eines Tages
+        return pd.Timedelta(seconds=round(float(val) % 1 * 86400, 3))
+
+    val = str(val).strip()
+    if val.count(":") == 1:
+        val += ":00"
+    return pd.Timedelta(val)
+
+
+def time_of_day(values: Any) -> pd.TimedeltaIndex:
+    """Uhrzeiten als Zeit seit Mitternacht
+
+    Excel-Zahlen werden direkt als Array umgerechnet. Bei allen anderen Typen
+    (datetime.time, Text, ...) wird nur jede vorkommende Uhrzeit einmal
+    umgewandelt (bei 15-Minuten-Werten also 96 mal, egal wie lang die Reihe ist).
+    """
+    values = pd.Series(values)
+
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_timedelta(np.round(values.to_numpy() % 1 * 86400, 3), unit="s")
+
+    codes, uniques = pd.factorize(values)
+    lis_td = pd.to_timedelta(
+        [_unique_time_of_day(val) for val in uniques] + [pd.NaT]
+    ).to_numpy()
+
+    # code -1 (leere Zelle) zeigt auf das angehängte NaT
+    return pd.TimedeltaIndex(lis_td[codes])
+
+
+def combine_date_time(dates: Any, times: Any) -> pd.DatetimeIndex:
+    """Datum und Uhrzeit zu einem DatetimeIndex zusammenfügen"""
+    dates = pd.Series(dates)
+
+    if pd.api.types.is_numeric_dtype(dates):
+        # Excel-Datum (Tage seit 30.12.1899)
+        dat = pd.to_datetime(np.floor(dates.to_numpy()), unit="D", origin="1899-12-30")
+    else:
+        dat = pd.to_datetime(dates.to_numpy(), format="%Y-%m-%d")
+
+    return pd.DatetimeIndex(dat.normalize() + time_of_day(times))
 
 
 # Index aus Datum und Zeit
@@ -18,13 +81,7 @@ def idx_date_time(
     df: pd.DataFrame, col_date: str = "Datum", col_time: str = "Uhrzeit"
 ) -> None:
     """Index in datetime umwandeln"""
-    ind = (
-        pd.to_datetime(df.loc[:, col_date].values, format="%Y-%m-%d")
-        + pd.to_timedelta([x.hour for x in df.loc[:, col_time].values], unit="hours")
-        + pd.to_timedelta(
-            [x.minute for x in df.loc[:, col_time].values], unit="minutes"
-        )
-    )
+    ind = combine_date_time(df.loc[:, col_date].values, df.loc[:, col_time].values)
 
     df.set_index(ind, inplace=True)
 
@@ -33,114 +90,109 @@ def idx_date_time(
 
 
 # 12 Stunden Uhr ohne am / pm in 24 Stunden umwandeln
+@dics.timer()
+def repair_12h(dic_df: dict, time_column: str = "Zeit") -> tuple[dict, list]:
+    """Zeitreihen ohne Unterscheidung zwischen vormittags und nachmittags
+
+    Die Zeitspalten aller dfs werden hintereinander gehängt und in einem
+    Durchgang als Ganzzahlen bearbeitet: springt die Stunde innerhalb eines
+    Tages zurück (12 Uhr → 1 Uhr), ist der Rest des Tages Nachmittag
+    (kumulative Summe der Sprünge je Tag) und bekommt 12 Stunden dazu.
+
+    Returns:
+        - dictionary mit korrigierten dfs
+        - Liste der dfs (keys), die korrigiert wurden
+    """
+    keys = list(dic_df)
+    if not keys:
+        return dic_df, []
+
+    lis_ns = [dic_df[key][time_column].to_numpy(dtype="datetime64[ns]") for key in keys]
+    lengths = np.array([len(arr) for arr in lis_ns])
+    stamps = np.concatenate(lis_ns)
+    days = stamps.astype("datetime64[D]")
+    hours = (stamps - days) // np.timedelta64(1, "h")
+
+    # neuer Tag (auch an den Grenzen zwischen den dfs - leere dfs haben keine)
+    new_day = np.ones(len(stamps), dtype=bool)
+    new_day[1:] = days[1:] != days[:-1]
+    bounds = np.cumsum(lengths)[:-1]
+    new_day[bounds[bounds < len(stamps)]] = True
+
+    # Sprünge zurück innerhalb eines Tages
+    jump = np.zeros(len(stamps), dtype=bool)
+    jump[1:] = hours[1:] < hours[:-1]
+    jump &= ~new_day
+
+    jumps_cum = np.cumsum(jump)
+    afternoon = (jumps_cum - jumps_cum[new_day][np.cumsum(new_day) - 1]) > 0
+
+    lis_corrected = []
+    for key, aft in zip(keys, np.split(afternoon, np.cumsum(lengths)[:-1])):
+        if aft.any():
+            dic_df[key][time_column] += aft.astype("int64") * np.timedelta64(12, "h")
+            lis_corrected.append(key)
+
+    return dic_df, lis_corrected
+
+
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def am_pm(dic_df: dict, time_column: str = "Zeit") -> dict:
     """Zeitreihen ohne Unterscheidung zwischen vormittags und nachmittags"""
-    for key in dic_df:
-        if any(
-            dic_df[key][time_column].dt.hour.diff().values < 0
-        ) and any(  # Stunden haben negative Differenz
-            dic_df[key][time_column].dt.day.diff().values == 0
-        ):  # Tag bleibt gleich
-
-            conditions = [
-                (dic_df[key][time_column].dt.day.diff().values > 0),  # neuer Tag
-                (dic_df[key][time_column].dt.month.diff().values != 0),  # neuer Monat
-                (dic_df[key][time_column].dt.year.diff().values != 0),  # neues Jahr
-                (  # Mittag
-                    (dic_df[key][time_column].dt.hour.diff().values < 0)
-                    & (  # Stunden haben negative Differenz
-                        dic_df[key][time_column].dt.day.diff().values == 0
-                    )  # Tag bleibt gleich
-                ),
-            ]
-
-            choices = [
-                pd.Timedelta(0, "h"),
-                pd.Timedelta(0, "h"),
-                pd.Timedelta(0, "h"),
-                pd.Timedelta(12, "h"),
-            ]
-
-            offset = pd.Series(
-                data=np.select(conditions, choices, default=np.nan),
-                index=dic_df[key][time_column].index,
-                dtype="timedelta64[ns]",
-            )
-
-            offset[0] = pd.Timedelta(0)
-            offset.fillna(method="ffill", inplace=True)
 
-            dic_df[key][time_column] += offset
+    dic_df, st.session_state["lis_am_pm"] = repair_12h(dic_df, time_column)
 
     return dic_df
 
 
 # Sommer-/Winterzeitumstellung
-# @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
-@dics.timer()
-def dls(df: pd.DataFrame) -> tuple:
-    """Zeitumstellung - doppelte Stunde löschen"""
-    # df innerhalb der Funktion
-    framedel = df.copy().reset_index()
-
-    conditions = [
-        # Sommerzeitumstellung: letzter Sonntag im Maerz - von 2h auf 3h
-        (
-            (df.index.month.values == 3)  # Monat = 3 ---> März
-            & (df.index.day.values > (31 - 7))  # letzte Woche (Tag > 31-7)
-            & (df.index.weekday.values == 6)  # Wochentag = 6 ---> Sonntag
-            & (df.index.hour.values == 3)  # Stunde 2 wird ausgelassen
-        ),
-        # Winterzeitumstellung: letzter Sonntag im Oktober - von 3h auf 2h (2h doppelt)
-        (
-            (df.index.month.values == 10)  # Monat = 10 ---> Oktober
-            & (df.index.day.values > (31 - 7))  # letzte Woche (Tag > 31-7)
-            & (df.index.weekday.values == 6)  # Wochentag = 6 ---> Sonntag
-            & (df.index.hour.values == 2)  # Stunde 2 gibt es doppelt
-        ),
-    ]
-    choices = ["Sommer", "Winter"]
-    so_wi = np.select(conditions, choices, "")
-
-    # neue Spalte im neuen df zur Markierung der zu löschenden Zeilen
-    df["del"] = False
-
-    # Winterzeitumstellung für jedes vorhandene Jahr bearbeiten
-    for year_i in df.index.year.unique():
+TZ_LOCAL: str = "Europe/Berlin"
 
-        # Prüfung, ob eine Zeitumstellung in den Daten ist
-        # (negative Zeitdifferenz im Bereich der Winterzeitumstellung)
-        if df.loc[
-            (so_wi == "Winter") & (df.index.year == year_i)
-        ].index.to_series().diff().min() < pd.Timedelta(0):
-
-            print("Winterzeitumstellung", year_i, "wurde gefunden.")
-
-            wi_len = ((so_wi == "Winter") & (df.index.year == year_i)).sum() / 2
-            wi_start = (
-                np.where((so_wi == "Winter") & (df.index.year == year_i))[0].min()
-                + wi_len
-            )
 
-            # print("Winterzeitumstellung", wi_start, "bis", wi_start + wi_len)
-
-            todel = (
-                (so_wi == "Winter")
-                & (framedel.index >= wi_start)
-                & (framedel.index < (wi_start + wi_len))
-            )
-
-            df["del"] += todel  # Position der doppelten Stunde (zu löschende Zeilen)
-        # else:
-        # print('Für das Jahr', i, 'wurde keine Winterzeitumstellung gefunden')
+# @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
+@dics.timer()
+def dls(df: pd.DataFrame, tz: str = TZ_LOCAL, localize: bool = False) -> tuple:
+    """Zeitumstellung - doppelte Stunde löschen
+
+    Bei der Umstellung auf Winterzeit wird die Stunde von 2 bis 3 Uhr doppelt
+    aufgezeichnet (die Zeit springt zurück). Gelöscht werden Zeilen, deren
+    Zeitstempel nicht nach dem bisher größten Zeitstempel liegt (laufendes
+    Maximum) und in der Zeitzone mehrdeutig ist - in einem Durchgang für alle
+    Jahre. Bei der Umstellung auf Sommerzeit fehlt die Stunde nur.
+
+    Args:
+        - df: Daten mit lokalen Zeitstempeln (ohne Zeitzone)
+        - tz: Zeitzone der Daten
+        - localize: Index mit Zeitzone ausgeben (Winterzeit-Stunde = Sommerzeit,
+            Zeitstempel in der Sommerzeit-Lücke werden nach vorne verschoben)
+
+    Returns:
+        - df ohne doppelte Stunde
+        - df mit den gelöschten Zeilen
+    """
+    stamps = df.index.asi8
+    repeated = np.zeros(len(stamps), dtype=bool)
+    repeated[1:] = stamps[1:] <= np.maximum.accumulate(stamps)[:-1]
+
+    ambiguous = df.index.tz_localize(
+        tz, ambiguous="NaT", nonexistent="shift_forward"
+    ).isna()
+    todel = repeated & ambiguous & df.index.notna()
 
     # df in dem nur die entfernten Daten stehen
-    entf = df.loc[df["del"] is True].drop(labels="del", axis="columns")
+    entf = df.loc[todel]
 
     # df ohne doppelte 2Uhr-Stunde
-    df = df.loc[df["del"] is False].drop(labels="del", axis="columns")
+    df = df.loc[~todel]
+
+    if localize:
+        df = df.copy()
+        df.index = df.index.tz_localize(
+            tz,
+            ambiguous=np.ones(len(df), dtype=bool),
+            nonexistent="shift_forward",
+        )
 
     # df mit gelöschten Daten ausgeben
     return (df, entf)
@@ -164,92 +216,341 @@ def indx_dup(dic_df: dict, time_column: str = "Zeit") -> dict:
     return dic_df
 
 
+# Methoden zum Füllen von Lücken
+GAP_METHODS: tuple = ("linear", "akima", "pchip", "profile")
+
+
+def gap_lengths(mask: np.ndarray) -> np.ndarray:
+    """Länge der Lücke, zu der jede Zelle gehört (0 für vorhandene Werte)
+
+    Alle Spalten werden auf einmal berechnet: die Spalten werden
+    (getrennt durch eine leere Zeile) hintereinander gehängt und die
+    Längen aller Lücken über die Kanten der Maske bestimmt.
+    """
+    n_rows, n_cols = mask.shape
+    flat = np.vstack([mask, np.zeros((1, n_cols), dtype=bool)]).T.ravel()
+
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], flat.view(np.int8), [0]])))
+    starts, run_len = edges[::2], edges[1::2] - edges[::2]
+
+    lengths = np.zeros(len(flat), dtype=np.int64)
+    lengths[flat] = np.repeat(run_len, run_len)
+
+    return lengths.reshape(n_cols, n_rows + 1)[:, :n_rows].T
+
+
+def profile_fill(df: pd.DataFrame) -> pd.DataFrame:
+    """Lücken mit dem Mittelwert gleicher Wochentage und Uhrzeiten füllen"""
+    grp = df.groupby([df.index.dayofweek, df.index.hour, df.index.minute])
+
+    return df.fillna(grp.transform("mean"))
+
+
 # Lücken interpolieren
-# @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
-def interpol(dic_df: dict) -> dict:
-    """Lücken interpolieren"""
+def fill_gaps(
+    df: pd.DataFrame,
+    method: str = "akima",
+    max_gap: int | None = None,
+    stuck_values: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Lücken füllen
+
+    Args:
+        - df: Daten (Spalten mit "orgidx" werden nicht verändert)
+        - method: "linear", "akima", "pchip" oder "profile"
+            (Mittelwert gleicher Wochentage und Uhrzeiten)
+        - max_gap: längste Lücke (Anzahl Werte), die noch gefüllt wird
+        - stuck_values: hängende Werte (Differenz zum Vorwert == 0) als Lücke behandeln
+
+    Returns:
+        - df mit gefüllten Lücken
+        - Bericht: Anzahl der Lücken und gefüllten Werte je Spalte
+    """
+    if method not in GAP_METHODS:
+        raise ValueError(f"Methode '{method}' unbekannt - möglich: {GAP_METHODS}")
+
+    cols = [col for col in df.columns if "orgidx" not in col]
+    df_val = df[cols].astype("float64")
+
+    mask_nan = df_val.isna().to_numpy()
+    mask_stuck = (
+        (df_val.diff() == 0).to_numpy() if stuck_values else np.zeros_like(mask_nan)
+    )
+    mask_gap = mask_nan | mask_stuck
+    df_gap = df_val.mask(mask_gap)
+
+    if method == "profile":
+        df_fill = profile_fill(df_gap)
+    elif method == "linear" and isinstance(df.index, pd.DatetimeIndex):
+        df_fill = df_gap.interpolate("time", limit_area="inside")
+    else:
+        df_fill = df_gap.interpolate(method, limit_area="inside")
+
+    # zu lange Lücken nicht füllen
+    if max_gap is not None:
+        df_fill = df_fill.mask(gap_lengths(mask_gap) > max_gap)
+
+    mask_filled = mask_gap & df_fill.notna().to_numpy()
+
+    # nicht gefüllte hängende Werte bleiben wie sie waren
+    df_fill = df_fill.fillna(df_val)
+    df_filled = df.copy()
+    df_filled[cols] = df_fill
+
+    report = pd.DataFrame(
+        {
+            "Lücken": (np.diff(mask_gap.view(np.int8), axis=0) == 1).sum(axis=0)
+            + mask_gap[0],
+            "Werte fehlend": mask_nan.sum(axis=0),
+            "Werte hängend": (mask_stuck & ~mask_nan).sum(axis=0),
+            "Werte gefüllt": mask_filled.sum(axis=0),
+        },
+        index=cols,
+    )
 
-    for df in dic_df.values():
-        for col in list(df.columns):
-            df.loc[df[col].diff() == 0, col] = np.nan
-            df = df.interpolate("akima")  # 'akima'
+    return df_filled, report
+
+
+@dics.timer()
+def interpol(dic_df: dict, method: str = "akima", max_gap: int | None = None) -> dict:
+    """Lücken interpolieren (alle dfs im dictionary)"""
+
+    dic_report = {}
+    for key, df in dic_df.items():
+        dic_df[key], dic_report[key] = fill_gaps(df, method, max_gap)
+
+    st.session_state["dic_gap_report"] = dic_report
 
     return dic_df
 
 
+def akima_gaps(row: np.ndarray) -> np.ndarray:
+    """Lücken (NaN) innerhalb einer Linie mit akima füllen
+
+    Gleiche Werte wie pd.Series.interpolate("akima"), aber je Lücke nur mit
+    den nächsten vier Werten davor und danach (akima ist lokal) - statt
+    eines Splines über die ganze Linie. Lücken am Anfang und Ende bleiben.
+    """
+    nan = np.isnan(row)
+    valid = np.flatnonzero(~nan)
+    if not nan.any() or len(valid) < 2:
+        return row
+
+    row = row.copy()
+    pos_nan = np.flatnonzero(nan)
+    starts = pos_nan[np.diff(pos_nan, prepend=-2) != 1]
+    ends = pos_nan[np.diff(pos_nan, append=len(row) + 1) != 1] + 1
+    for start, end in zip(starts, ends):
+        pos = np.searchsorted(valid, start)
+        if pos == 0 or pos == len(valid):
+            continue
+        points = valid[max(pos - 4, 0) : pos + 4]
+        row[start:end] = interpolate.Akima1DInterpolator(points, row[points])(
+            np.arange(start, end)
+        )
+
+    return row
+
+
+# Ausreißer
+OUTLIER_METHODS: tuple = ("hampel", "zscore", "limit")
+
+# MAD -> Standardabweichung (Normalverteilung)
+MAD_SCALE: float = 1.4826
+
+# Fensterbreite in Werten, wenn der Zeitschritt der Daten unbekannt ist
+OUTLIER_WINDOW: int = 97
+
+# abgeleitete Daten und Grafiken, die nach einer Änderung von df neu erzeugt werden
+DERIVED: tuple = (
+    "df_h",
+    "df_jdl",
+    "df_mon",
+    "dic_df_multi",
+    "dic_jdl",
+    "dic_mon",
+    "dic_days",
+    "dic_pyramid",
+    "dic_pyramid_h",
+)
+FIGS: tuple = ("fig_base", "fig_jdl", "fig_mon", "fig_days")
+
+
+def outlier_window(hours: float, dic_meta: dict) -> int:
+    """Fensterbreite für outlier_mask aus Stunden (Anzahl Werte, ungerade)
+
+    Ohne bekannten Zeitschritt der Daten (dic_meta["index"]["td_mean"])
+    gilt OUTLIER_WINDOW.
+    """
+    td_mean = dic_meta.get("index", {}).get("td_mean")
+    if pd.isna(td_mean) or not td_mean:
+        return OUTLIER_WINDOW
+
+    return int(pd.Timedelta(hours=hours) / td_mean) | 1
+
+
+def outlier_mask(
+    df: pd.DataFrame,
+    method: str = "hampel",
+    window: int = OUTLIER_WINDOW,
+    n_sigma: float = 3.0,
+    limit: float | None = None,
+) -> pd.DataFrame:
+    """Ausreißer finden (alle Spalten auf einmal über gleitende Fenster)
+
+    Args:
+        - df: Daten (nur Zahlen-Spalten)
+        - method:
+            "hampel": Abstand zum gleitenden Median > n_sigma * MAD
+                (MAD als gleitender Median der Abstände, mal MAD_SCALE = 1.4826
+                - entspricht bei Normalverteilung der Standardabweichung)
+            "zscore": Abstand zum gleitenden Mittelwert > n_sigma * Standardabweichung
+            "limit": Werte über limit
+        - window: Fensterbreite (Anzahl Werte, zentriert: center=True,
+            der Wert liegt in der Mitte seines Fensters)
+        - n_sigma: Schwelle in Standardabweichungen
+
+    Returns:
+        - Maske (True = Ausreißer)
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Methode '{method}' unbekannt - möglich: {OUTLIER_METHODS}")
+
+    if method == "limit":
+        return df > limit
+
+    roll = df.rolling(window, center=True, min_periods=1)
+    if method == "hampel":
+        dev = (df - roll.median()).abs()
+        spread = dev.rolling(window, center=True, min_periods=1).median() * MAD_SCALE
+    else:
+        dev = (df - roll.mean()).abs()
+        spread = roll.std()
+
+    # in konstanten Abschnitten (z.B. nachts 0 kW) ist jeder Wechsel kein Ausreißer
+    return (dev > n_sigma * spread) & (spread > 0)
+
+
+def fill_outliers(df: pd.DataFrame, mask: pd.DataFrame) -> pd.DataFrame:
+    """Ausreißer löschen und mit akima füllen (am Anfang und Ende bleiben Lücken)"""
+    df_fill = df.astype("float64").mask(mask)
+    for col in df_fill.columns[mask.any().to_numpy()]:
+        df_fill[col] = akima_gaps(df_fill[col].to_numpy())
+
+    return df_fill
+
+
+@dics.timer()
+def clean_outliers(
+    method: str = "hampel",
+    window: int = OUTLIER_WINDOW,
+    n_sigma: float = 3.0,
+    limit: float | None = None,
+) -> None:
+    """Ausreißerbereinigung in st.session_state["df"]
+
+    Bereinigt wird immer die importierte Reihe (in sst "df_outl_raw", siehe
+    reset_outliers) - nicht die schon bereinigte.
+    Bericht in st.session_state["df_outl_report"]. Abgeleitete Daten und
+    Grafiken werden gelöscht und beim nächsten Zugriff aus den bereinigten
+    Daten neu erzeugt.
+    """
+    if not sst.has("df_outl_raw"):
+        sst.put("df_outl_raw", st.session_state["df"])
+    df = sst.get("df_outl_raw")
+    cols = [col for col in df.columns if "orgidx" not in col]
+
+    mask = outlier_mask(df[cols], method, window, n_sigma, limit)
+    df_clean = df.copy()
+    df_clean[cols] = fill_outliers(df[cols], mask)
+
+    st.session_state["df"] = df_clean
+    st.session_state["df_outl_report"] = pd.DataFrame(
+        {
+            "Ausreißer": mask.sum(),
+            "gefüllt": (mask & df_clean[cols].notna()).sum(),
+        }
+    )
+
+    del_derived()
+
+    # abgeleitete dfs gehören nicht mehr zur importierten Datei
+    dics.del_session_state_entry("import_key")
+
+
+@dics.timer()
+def reset_outliers() -> None:
+    """Ausreißerbereinigung zurücksetzen (importierte Reihe wiederherstellen)"""
+    if not sst.has("df_outl_raw"):
+        return
+
+    st.session_state["df"] = sst.get("df_outl_raw", copy=True)
+    sst.delete("df_outl_raw")
+    dics.del_session_state_entry("df_outl_report")
+
+    del_derived()
+
+
+def del_derived() -> None:
+    """abgeleitete Daten und Grafiken löschen (werden aus df neu erzeugt)"""
+    for name in DERIVED:
+        sst.delete(name)
+    for key in (*FIGS, "fig_stats"):
+        dics.del_session_state_entry(key)
+
+
+@lru_cache(maxsize=4096)
+def col_meta_obis(col: str) -> dict:
+    """Metadaten einer Spalte aus der OBIS-Kennzahl im Titel (leer ohne Kennzahl)"""
+    code = obis.parse(col)
+    if code is None or code.medium != obis.MEDIUM_EL:
+        return {}
+
+    messgr = dics.DIC_OBIS_EL_KEY["Messgröße"].get(code.messgr)
+    messart = dics.DIC_OBIS_EL_KEY["Messart"].get(code.messart)
+    if messgr is None or messart is None:
+        return {}
+
+    unit_data = " " + messgr["unit"]
+
+    return {
+        "code": code.code,
+        "messgr_c": code.messgr,
+        "messar_c": code.messart,
+        "messgr_n": messgr["alt_bez"],
+        "messar_n": messart["alt_bez"],
+        "unit_data": unit_data,
+        "unit_graph": " kW" if unit_data == " kWh" else unit_data,
+    }
+
+
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def cols_meta(df: pd.DataFrame) -> dict:
-    """Metadaten"""
+    """Metadaten
 
-    cols = df.columns
+    Kommt eine Messgröße mit verschiedenen Messarten vor,
+    wird die OBIS-Kennzahl an den Titel angehängt.
+    """
     # test:
-    # from fnmatch import fnmatch
-    # from modules import def_dics as dics
     # cols= ['Bezug 1-1:1.29.3', 'Lieferung (1-1:2.5.3)', '1-1:1.5.22']
-    dic_c_meta = {}
-    for col in cols:
-        dic_c_meta[col] = {"orig_tit": col}
-
-        if fnmatch(col, dics.OBIS_PATTERN_EL):
-            dic_c_meta[col]["code"] = "1-" + col.split("1-")[1].replace(
-                "(", ""
-            ).replace(")", "")
-            dic_c_meta[col]["messgr_c"] = col.split(":")[1].split(".")[0]
-            dic_c_meta[col]["messar_c"] = col.split(":")[1].split(".")[1]
-            dic_c_meta[col]["messgr_n"] = (
-                dics.DIC_OBIS_EL_KEY["Messgröße"]
-                .get(dic_c_meta[col]["messgr_c"])
-                .get("alt_bez")
-            )
-            dic_c_meta[col]["messar_n"] = (
-                dics.DIC_OBIS_EL_KEY["Messart"]
-                .get(dic_c_meta[col]["messar_c"])
-                .get("alt_bez")
-            )
-            dic_c_meta[col]["unit_data"] = " " + dics.DIC_OBIS_EL_KEY["Messgröße"].get(
-                dic_c_meta[col]["messgr_c"]
-            ).get("unit")
-            dic_c_meta[col]["unit_graph"] = (
-                " kW"
-                if dic_c_meta[col]["unit_data"] == " kWh"
-                else dic_c_meta[col]["unit_data"]
-            )
-        # else:
-        #     dic_c_meta[col]['code']     = None
-        #     dic_c_meta[col]['messgr_c'] = None
-        #     dic_c_meta[col]['messar_c'] = None
-        #     dic_c_meta[col]['messgr_n'] = None
-        #     dic_c_meta[col]['messar_n'] = None
-        #     dic_c_meta[col]['unit_data']     = None
-
-    messgr_vorh = {dic_c_meta[k].get("messgr_c") for k in dic_c_meta}
-
-    lis_c_lang = []
-    for messgr in messgr_vorh:
-        if messgr:
-            lis = [
-                dic_c_meta[k].get("messgr_c") + "." + dic_c_meta[k].get("messar_c")
-                for k in dic_c_meta
-                if dic_c_meta[k].get("messgr_c") == messgr
-            ]
-
-            if len(set(lis)) > 1:
-                lis_c_lang.append(messgr)
-
-    for col in dic_c_meta:
-        if dic_c_meta[col].get("code"):
-            dic_c_meta[col]["tit"] = (
-                dic_c_meta[col].get("messgr_n")
-                if dic_c_meta[col].get("messgr_c") not in lis_c_lang
-                else dic_c_meta[col].get("messgr_n")
-                + " ("
-                + dic_c_meta[col].get("code")
-                + ")"
-            )
+    dic_c_meta = {
+        col: {"orig_tit": col, **col_meta_obis(str(col))} for col in df.columns
+    }
+
+    dic_messarten = {}
+    for meta in dic_c_meta.values():
+        if meta.get("code"):
+            dic_messarten.setdefault(meta["messgr_c"], set()).add(meta["messar_c"])
+
+    for meta in dic_c_meta.values():
+        if not meta.get("code"):
+            meta["tit"] = meta["orig_tit"]
+        elif len(dic_messarten[meta["messgr_c"]]) > 1:
+            meta["tit"] = f'{meta["messgr_n"]} ({meta["code"]})'
         else:
-            dic_c_meta[col]["tit"] = col
+            meta["tit"] = meta["messgr_n"]
 
     return dic_c_meta
 
@@ -265,11 +566,61 @@ def del_smooth() -> None:
                 if "(glatt)" in col:
                     item.drop(columns=[col], inplace=True)
 
-    # Linien löschen
-    lis_dat = [
-        dat for dat in st.session_state["fig_base"].data if "(glatt)" not in dat.name
-    ]
-    st.session_state["fig_base"].data = tuple(lis_dat)
+    # Linien löschen (mit ihren Kennwerten, siehe fig_update_anno.fig_stats)
+    fig = st.session_state["fig_base"]
+    fig.data = tuple(dat for dat in fig.data if "(glatt)" not in dat.name)
+    dic_stats = st.session_state.get("fig_stats", {}).get("fig_base", {})
+    for key in [key for key in dic_stats if "(glatt)" in key]:
+        del dic_stats[key]
+
+
+def fold_index(
+    index: pd.DatetimeIndex, year: int, target: int = 2020
+) -> pd.DatetimeIndex:
+    """Zeitstempel eines Jahres in das Zieljahr verschieben (wie replace(year=...))
+
+    Die Verschiebung ist eine reine Zeitdauer. Wird ein Nicht-Schaltjahr
+    in ein Schaltjahr verschoben (oder umgekehrt), wird ab dem 1. März
+    ein Tag addiert (abgezogen), damit der 29. Februar übersprungen wird
+    und alle anderen Tage auf dem gleichen Datum bleiben.
+    (Ein 29. Februar landet in einem Nicht-Schaltjahr auf dem 1. März.)
+    """
+    shift = pd.Timestamp(target, 1, 1) - pd.Timestamp(year, 1, 1)
+    leap_diff = int(calendar.isleap(target)) - int(calendar.isleap(year))
+    if leap_diff == 0:
+        return index + shift
+
+    after_feb = index >= pd.Timestamp(year, 3, 1)
+
+    return index + shift + pd.to_timedelta(after_feb * leap_diff, unit="D")
+
+
+@dics.timer()
+def fold_years(df: pd.DataFrame, lis_years: list, target: int = 2020) -> dict:
+    """df in Jahre aufteilen und alle Jahre auf das Zieljahr legen
+
+    Bei sortiertem Index werden die Jahre über searchsorted als Bereiche
+    ausgeschnitten. Die Werte werden kopiert, damit spätere Änderungen
+    (Glättung, Ausreißer) nicht in df zurückschreiben.
+    Returns: {Jahr: df mit Zeitstempeln im Zieljahr und "orgidx" (Original)}
+    """
+    dic_df = {}
+    for year in lis_years:
+        if df.index.is_monotonic_increasing:
+            start, end = df.index.searchsorted(
+                [pd.Timestamp(year, 1, 1), pd.Timestamp(year + 1, 1, 1)]
+            )
+            df_y = df.iloc[start:end].copy()
+        else:
+            df_y = df.loc[df.index.year == year].copy()
+
+        if "orgidx" not in df_y.columns:
+            df_y["orgidx"] = df_y.index
+        df_y.index = fold_index(df_y.index, year, target)
+
+        dic_df[year] = df_y
+
+    return dic_df
 
 
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
@@ -288,36 +639,31 @@ def df_multi_y(df: pd.DataFrame) -> None:
 
     keys = [k for k in keys_without_years if all(k not in y for y in keys_with_years)]
 
-    dic_df_multi = {}
+    dic_df_multi = fold_years(df, st.session_state["lis_years"])
     for year in st.session_state["lis_years"]:
-        dic_df_multi[year] = df.loc[df.index.year == year, :].copy()
-        dic_df_multi[year]["orgidx"] = df.loc[df.index.year == year, :].index
-        if year != 2020:
-            dic_df_multi[year].index = [
-                dic_df_multi[year].index[x].replace(year=2020)
-                for x in range(len(dic_df_multi[year].index))
-            ]
-
         for key in keys:
             st.session_state["dic_meta"][key + " " + str(year)] = st.session_state[
                 "dic_meta"
             ][key]
 
-    st.session_state["dic_df_multi"] = dic_df_multi
+    sst.put("dic_df_multi", dic_df_multi)
 
     # df geordnete Jahresdauerlinie
     if st.session_state.get("cb_jdl"):
-        dic_jdl = {y: jdl(dic_df_multi[y]) for y in st.session_state["lis_years"]}
-        st.session_state["dic_jdl"] = dic_jdl
-
-    # df Monatswerte
-    if st.session_state.get("cb_mon"):
-        dic_mon = {
-            y: mon(dic_df_multi[y], st.session_state["dic_meta"], y)
+        dic_df_h = {
+            y: (
+                h_from_other(dic_df_multi[y], st.session_state["dic_meta"])
+                if dic_df_multi[y].index.to_series().diff().mean().round("min")
+                < pd.Timedelta(hours=1)
+                else dic_df_multi[y]
+            )
             for y in st.session_state["lis_years"]
         }
+        sst.put("dic_jdl", jdl_batch(dic_df_h))
 
-        st.session_state["dic_mon"] = dic_mon
+    # df Monatswerte
+    if st.session_state.get("cb_mon"):
+        sst.put("dic_mon", mon_batch(dic_df_multi, st.session_state["dic_meta"]))
 
 
 # Stundenwerte aus Zählerpunkten
@@ -336,45 +682,123 @@ def df_multi_y(df: pd.DataFrame) -> None:
 
 
 # Stundenwerte aus anderer zeitlicher Auflösung
+def resample_h(
+    df: pd.DataFrame, dic_meta: dict, td_mean: pd.Timedelta = None
+) -> tuple[pd.DataFrame, dict]:
+    """Stundenwerte (ohne Nebenwirkungen - kein st.session_state)
+
+    Die Spalten werden nach ihren Einheiten in Mittelwert- und Summen-Spalten
+    aufgeteilt und mit je einem resample umgerechnet.
+
+    Args:
+        - df: Daten
+        - dic_meta: Metadaten (wird nicht verändert)
+        - td_mean: zeitliche Auflösung der Daten (sonst aus dem Index berechnet)
+
+    Returns:
+        - df mit Stundenwerten (Spalten mit " *h")
+        - Änderungen für dic_meta ({key: {Eintrag: Wert}})
+    """
+    cols = [col for col in df.columns if "orgidx" not in col]
+    if td_mean is None:
+        td_mean = df.index.to_series().diff().mean().round("min")
+
+    if td_mean < pd.Timedelta(hours=1):
+        cols_mean = [
+            col for col in cols if dic_meta[col].get("unit_data") in dics.GRP_MEAN
+        ]
+        cols_sum = [col for col in cols if col not in cols_mean]
+        df_h = pd.concat(
+            [
+                df[cols_mean].resample("H").mean(),
+                df[cols_sum].resample("H").sum(),
+            ],
+            axis=1,
+        )[cols]
+    else:
+        df_h = df[cols].copy()
+
+    df_h.columns = [col if col.endswith(" *h") else col + " *h" for col in cols]
+    df_h["orgidx"] = df_h.index.copy()
+
+    return df_h, meta_h(cols, dic_meta)
+
+
+def meta_h(cols: list, dic_meta: dict) -> dict:
+    """Änderungen für dic_meta durch Stundenwerte ({key: {Eintrag: Wert}})"""
+    meta_upd = {}
+    for col in cols:
+        col_h = col if col.endswith(" *h") else col + " *h"
+        unit_data = dic_meta[col].get("unit_data")
+        unit_graph = " kW" if unit_data == " kWh" else unit_data
+        meta_upd[col] = {"unit_graph": unit_graph}
+        meta_upd[col_h] = {**dic_meta[col], "unit_graph": unit_graph}
+
+    return meta_upd
+
+
 @dics.timer()
 def h_from_other(df: pd.DataFrame, dic_meta: dict) -> pd.DataFrame:
     """Stundenwerte"""
 
-    df_h = pd.DataFrame()
-    for col in [col for col in df.columns if "orgidx" not in col]:
-        if col.endswith(" *h"):
-            df_h.loc[:, col] = df.loc[:, col].copy()
-        else:
-            dic_meta[col + " *h"] = dic_meta[col].copy()
-
-        if st.session_state["dic_meta"]["index"]["td_mean"] < pd.Timedelta(hours=1):
-            if dic_meta[col].get("unit_data") in dics.GRP_MEAN:
-                df_h.loc[:, col + " *h"] = df.loc[:, col].resample("H").mean()
-            else:
-                df_h.loc[:, col + " *h"] = df.loc[:, col].resample("H").sum()
-
-        if st.session_state["dic_meta"]["index"]["td_mean"] == pd.Timedelta(hours=1):
-            df_h.loc[:, col + " *h"] = df.loc[:, col].copy()
-
-        for key in [col, col + " *h"]:
-            dic_meta[key]["unit_graph"] = (
-                " kW"
-                if dic_meta[key].get("unit_data") == " kWh"
-                else dic_meta[key].get("unit_data")
-            )
+    df_h, meta_upd = resample_h(
+        df, dic_meta, st.session_state["dic_meta"]["index"]["td_mean"]
+    )
+    for key, upd in meta_upd.items():
+        dic_meta.setdefault(key, {}).update(upd)
 
-            # dic_meta[k+' *h']['unit'] = (
-            #     dic_meta[k].get('unit') + 'h'
-            #     if dic_meta[k].get('unit')[-1] != 'h'
-            #     else dic_meta[k].get('unit')
-            # )
-    df_h["orgidx"] = df_h.index.copy()
     st.session_state["dic_meta"] = dic_meta
 
     return df_h
 
 
 # Jahresdauerlinie
+@dics.timer()
+def jdl_batch(dic_df: dict) -> dict:
+    """Jahresdauerlinien mehrerer dfs (z.B. aller Jahre) auf einmal
+
+    Alle Spalten aller dfs werden in ein Array geschrieben (kürzere dfs mit NaN
+    aufgefüllt) und mit einem einzigen argsort absteigend sortiert.
+    Werte und Original-Zeitstempel werden über die Sortier-Indizes eingesammelt.
+    """
+    if not dic_df:
+        return {}
+
+    cols = [col for col in next(iter(dic_df.values())).columns if "orgidx" not in col]
+    len_max = max(len(df) for df in dic_df.values())
+
+    values = np.full((len_max, len(dic_df), len(cols)), np.nan)
+    stamps = np.full((len_max, len(dic_df)), np.datetime64("NaT"), "datetime64[ns]")
+    for pos, df in enumerate(dic_df.values()):
+        values[: len(df), pos] = df[cols].to_numpy(dtype="float64")
+        stamps[: len(df), pos] = (
+            df["orgidx"] if "orgidx" in df.columns else df.index
+        ).to_numpy(dtype="datetime64[ns]")
+
+    # NaN (auch das Auffüllen) landen beim absteigenden Sortieren am Ende
+    order = np.argsort(-values, axis=0, kind="stable")
+    values_sorted = np.take_along_axis(values, order, axis=0)
+    stamps_sorted = np.take_along_axis(
+        np.broadcast_to(stamps[:, :, None], values.shape), order, axis=0
+    )
+
+    dic_jdl = {}
+    for pos, (key, df) in enumerate(dic_df.items()):
+        len_df = len(df)
+        dic_jdl[key] = pd.concat(
+            [
+                pd.DataFrame(values_sorted[:len_df, pos], columns=cols),
+                pd.DataFrame(
+                    stamps_sorted[:len_df, pos],
+                    columns=[f"{col}_orgidx" for col in cols],
+                ),
+            ],
+            axis=1,
+        ).set_axis(range(1, len_df + 1))
+
+    return dic_jdl
+
+
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def jdl(df: pd.DataFrame) -> pd.DataFrame:
@@ -383,26 +807,37 @@ def jdl(df: pd.DataFrame) -> pd.DataFrame:
     if df.index.to_series().diff().mean().round("min") < pd.Timedelta(hours=1):
         df = h_from_other(df, st.session_state["dic_meta"])
 
-    df_jdl = pd.DataFrame(
-        index=range(1, len(df.index) + 1),
-        columns=[c for c in df.columns if c != "orgidx"],
-    )
+    df_jdl = jdl_batch({"df": df})["df"]
 
-    for col in df_jdl.columns:
-        df_col = df.sort_values(col, ascending=False)
+    sst.put("df_jdl", df_jdl)
 
-        df_jdl[col] = df_col[col].values
+    return df_jdl
 
-        df_jdl[col + "_orgidx"] = (
-            df_col["orgidx"].values if "orgidx" in df_col.columns else df_col.index
-        )
 
-    st.session_state["df_jdl"] = df_jdl
+# Monatswerte
+def agg_rules(cols: list, dic_meta: dict) -> dict:
+    """Aggregation je Spalte für Monatswerte (aus den Einheiten in dic_meta)
 
-    return df_jdl
+    Mittelwert für Einheiten aus dics.GRP_MEAN (z.B. °C),
+    sonst Summe (Leistung in kW aus Stundenwerten wird so zur Arbeit in kWh)
+    """
+    units_mean = [unit for unit in dics.GRP_MEAN if unit not in [" kWh", " kW"]]
+
+    return {
+        col: "mean" if dic_meta[col].get("unit_data") in units_mean else "sum"
+        for col in cols
+    }
+
+
+def resample_mon(df: pd.DataFrame, dic_meta: dict) -> pd.DataFrame:
+    """alle Spalten in einem Durchgang zu Monatswerten (Index: 15. des Monats)"""
+    cols = [col for col in df.columns if "orgidx" not in col]
+    df_mon = df[cols].resample("M").agg(agg_rules(cols, dic_meta))
+    df_mon.index = df_mon.index.to_period("M").to_timestamp() + pd.Timedelta(days=14)
+
+    return df_mon
 
 
-# Monatswerte
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def mon(df: pd.DataFrame, dic_meta: dict, year: int = None) -> pd.DataFrame:
@@ -411,58 +846,275 @@ def mon(df: pd.DataFrame, dic_meta: dict, year: int = None) -> pd.DataFrame:
     if df.index.to_series().diff().mean().round("min") < pd.Timedelta(hours=1):
         df = h_from_other(df, dic_meta)
 
-    df_mon = df.groupby(pd.Grouper(freq="M")).sum()
-    for col in df_mon.columns:
-        if dic_meta[col].get("unit_data") in [
-            unit for unit in dics.GRP_MEAN if unit not in [" kWh", " kW"]
-        ]:
-            df_mon[col] = df[col].resample("M").mean()
-
-    df_mon.index = [df_mon.index[x].replace(day=15) for x in range(len(df_mon.index))]
+    df_mon = resample_mon(df, dic_meta)
 
     if year:
-        df_mon["orgidx"] = [
-            df_mon.index[x].replace(year=year) for x in range(len(df_mon.index))
-        ]
+        df_mon["orgidx"] = fold_index(df_mon.index, df_mon.index[0].year, year)
     else:
         df_mon["orgidx"] = df_mon.index.copy()
 
-    st.session_state["df_mon"] = df_mon
+    sst.put("df_mon", df_mon)
 
     return df_mon
 
 
+@dics.timer()
+def mon_batch(dic_df: dict, dic_meta: dict, target: int = 2020) -> dict:
+    """Monatswerte aller Jahre in einem Durchgang
+
+    Die Jahre werden über ihre Original-Zeitstempel ("orgidx") wieder
+    hintereinander gehängt, gemeinsam aggregiert und danach wieder
+    aufgeteilt und auf das Zieljahr gelegt.
+    """
+    df_all = pd.concat(
+        [
+            df.set_index("orgidx", drop=False) if "orgidx" in df.columns else df
+            for df in dic_df.values()
+        ]
+    ).sort_index()
+
+    if df_all.index.to_series().diff().mean().round("min") < pd.Timedelta(hours=1):
+        df_all = h_from_other(df_all, dic_meta)
+
+    df_mon_all = resample_mon(df_all, dic_meta)
+
+    dic_mon = {}
+    for year in dic_df:
+        df_mon = df_mon_all.loc[df_mon_all.index.year == year].copy()
+        df_mon["orgidx"] = df_mon.index
+        df_mon.index = fold_index(df_mon.index, year, target)
+        dic_mon[year] = df_mon
+
+    return dic_mon
+
+
+# Auflösungsstufen für die Darstellung großer Datenmengen (fein -> grob)
+PYRAMID_FREQS: tuple = ("H", "D")
+
+
+def bucket_extremes(df: pd.DataFrame, freq: str) -> np.ndarray:
+    """Positionen der Zeilen mit Minimum und Maximum jeder Spalte je Zeitabschnitt
+
+    (df muss nach dem Index sortiert sein)
+    """
+    cols = [col for col in df.columns if "orgidx" not in col]
+    buckets = df.index.floor(freq).asi8
+    starts = np.r_[0, np.flatnonzero(np.diff(buckets)) + 1]
+    lengths = np.diff(np.r_[starts, len(buckets)])
+
+    lis_pos = [np.array([0, len(df) - 1])]
+    for values in df[cols].to_numpy(dtype="float64").T:
+        for reduce in (np.fmin, np.fmax):
+            extreme = np.repeat(reduce.reduceat(values, starts), lengths)
+            hits = np.flatnonzero(values == extreme)
+            if len(hits):
+                lis_pos.append(
+                    hits[np.minimum(np.searchsorted(hits, starts), len(hits) - 1)]
+                )
+
+    return np.unique(np.concatenate(lis_pos))
+
+
+@dics.timer()
+def pyramid(df: pd.DataFrame) -> dict:
+    """Lastgang in mehreren Auflösungsstufen ({freq: df})
+
+    Jede Stufe enthält nur die Zeilen mit Minimum und Maximum jeder Spalte
+    je Zeitabschnitt (z.B. Stunde, Tag) - echte Messwerte, Spitzen bleiben
+    erhalten. Stufen mit nicht mindestens halb so vielen Zeilen wie die
+    vorherige werden weggelassen.
+    """
+    dic_pyramid = {}
+    rows_prev = len(df)
+    for freq in PYRAMID_FREQS:
+        rows = bucket_extremes(df, freq)
+        if len(rows) * 2 <= rows_prev:
+            dic_pyramid[freq] = df.iloc[rows]
+            rows_prev = len(rows)
+
+    return dic_pyramid
+
+
+def pyramid_level(
+    df: pd.DataFrame, dic_pyramid: dict, start: Any, end: Any, n_points: int
+) -> pd.DataFrame:
+    """Zeitraum aus der feinsten Stufe, die höchstens n_points Zeilen hat
+    (sonst aus der gröbsten Stufe)"""
+    for level in [df, *dic_pyramid.values()]:
+        df_range = level.loc[start:end]
+        if not n_points or len(df_range) <= n_points:
+            break
+
+    return df_range
+
+
+@dics.timer()
+def df_pyramid(df: pd.DataFrame, name: str = "dic_pyramid") -> dict:
+    """Auflösungsstufen aus dem Speicher der Sitzung
+
+    (neu erzeugt, wenn sich die Spalten oder der Zeitraum von df geändert haben)
+    """
+    sig = [list(df.columns), len(df), str(df.index[0]), str(df.index[-1])]
+    if sst.has(name) and st.session_state.get(f"{name}_sig") == sig:
+        return sst.get(name)
+
+    dic_pyramid = pyramid(df)
+    sst.put(name, dic_pyramid)
+    st.session_state[f"{name}_sig"] = sig
+
+    return dic_pyramid
+
+
+# Daten fortschreiben (angehängte Zeilen)
+def merge_jdl(df_jdl: pd.DataFrame, df_add: pd.DataFrame, cut: Any) -> pd.DataFrame:
+    """neue (absteigend sortierte) Werte in eine Jahresdauerlinie einsortieren
+
+    Werte der bisherigen Jahresdauerlinie ab "cut" (Original-Zeitstempel)
+    werden vorher entfernt. Bei gleichen Werten kommen die neuen nach den
+    bisherigen - wie beim stabilen Sortieren der ganzen Zeitreihe.
+    """
+    dic_col = {}
+    for col in [col for col in df_jdl.columns if not col.endswith("_orgidx")]:
+        col_ts = f"{col}_orgidx"
+        keep = (df_jdl[col_ts] < cut).to_numpy()
+        values = df_jdl[col].to_numpy(dtype="float64")[keep]
+        stamps = df_jdl[col_ts].to_numpy(dtype="datetime64[ns]")[keep]
+        add = df_add[col].to_numpy(dtype="float64")
+
+        pos = np.searchsorted(-values, -add, side="right")
+        dic_col[col] = np.insert(values, pos, add)
+        dic_col[col_ts] = np.insert(
+            stamps, pos, df_add[col_ts].to_numpy(dtype="datetime64[ns]")
+        )
+
+    df_merged = pd.DataFrame(dic_col)[list(df_jdl.columns)]
+
+    return df_merged.set_axis(range(1, len(df_merged) + 1))
+
+
+@dics.timer()
+def append_products(
+    dic_products: dict, df: pd.DataFrame, dic_meta: dict, start: Any
+) -> tuple[dict, dict]:
+    """abgeleitete dfs (df_h, df_mon, df_jdl) für angehängte Zeilen fortschreiben
+
+    Nur die Stunde bzw. der Monat, in die die neuen Zeilen fallen, und alles
+    danach wird neu berechnet - der Rest wird aus den bisherigen dfs übernommen.
+
+    Args:
+        - dic_products: bisherige dfs ({"df_h": ..., "df_mon": ..., "df_jdl": ...})
+        - df: alle Daten (bisherige und neue Zeilen)
+        - dic_meta: Metadaten (wird nicht verändert)
+        - start: erster Zeitstempel der neuen Zeilen
+
+    Returns:
+        - fortgeschriebene dfs
+        - Änderungen für dic_meta ({key: {Eintrag: Wert}})
+    """
+    td_mean = dic_meta["index"]["td_mean"]
+    cut_h = start.floor("H")
+    cut_mon = cut_h.to_period("M").to_timestamp()
+
+    df_tail = df.loc[df.index >= cut_mon]
+    df_h_tail, meta_upd = resample_h(df_tail, dic_meta, td_mean)
+    df_h_add = df_h_tail.loc[df_h_tail.index >= cut_h]
+
+    dic_upd = {}
+    if "df_h" in dic_products:
+        df_h = dic_products["df_h"]
+        dic_upd["df_h"] = pd.concat([df_h.loc[df_h.index < cut_h], df_h_add])
+
+    if "df_jdl" in dic_products:
+        df_add = jdl_batch({"df": df_h_add})["df"]
+        dic_upd["df_jdl"] = merge_jdl(dic_products["df_jdl"], df_add, cut_h)
+
+    if "df_mon" in dic_products:
+        df_mon = dic_products["df_mon"]
+        dic_meta_h = {
+            **dic_meta,
+            **{key: {**dic_meta.get(key, {}), **upd} for key, upd in meta_upd.items()},
+        }
+        df_mon_add = resample_mon(
+            df_h_tail if td_mean < pd.Timedelta(hours=1) else df_tail, dic_meta_h
+        )
+        df_mon_add["orgidx"] = df_mon_add.index.copy()
+        dic_upd["df_mon"] = pd.concat(
+            [df_mon.loc[df_mon["orgidx"] < cut_mon], df_mon_add]
+        )
+
+    return dic_upd, meta_upd
+
+
+@dics.timer()
+def day_profiles(df: pd.DataFrame, dates: list) -> dict:
+    """Tagesprofile für eine Liste von Tagen in einem Durchgang
+
+    Alle gewählten Tage werden mit einer Maske auf einmal ausgeschnitten,
+    der Index wird zur Uhrzeit am 1.1.2020 (Zeit seit Mitternacht) und
+    die Tage werden per groupby aufgeteilt.
+    Returns: {"dd. Mon YYYY": df} in der Reihenfolge der gewählten Tage
+    """
+    days = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+    idx_days = df.index.normalize()
+    mask = idx_days.isin(days)
+
+    df_sel = df.loc[mask].copy()
+    df_sel["orgidx"] = df_sel.index
+    df_sel.index = pd.Timestamp(2020, 1, 1) + (df_sel.index - idx_days[mask])
+
+    dic_grp = dict(tuple(df_sel.groupby(idx_days[mask])))
+
+    return {f"{day:%d. %b %Y}": dic_grp[day] for day in days if day in dic_grp}
+
+
 @dics.timer()
 def dic_days(df: pd.DataFrame) -> None:
     """dictionary für Tage"""
 
-    st.session_state["dic_days"] = {}
-    for num in range(int(st.session_state["ni_days"])):
-        date = st.session_state[f"day_{str(num)}"]
+    sst.put(
+        "dic_days",
+        day_profiles(
+            df,
+            [
+                st.session_state[f"day_{str(num)}"]
+                for num in range(int(st.session_state["ni_days"]))
+            ],
+        ),
+    )
 
-        item = st.session_state["dic_days"][f"{date:%d. %b %Y}"] = df.loc[
-            f"{date:%Y-%m-%d}"
-        ].copy()
 
-        item["orgidx"] = item.index.copy()
-        item.index = [
-            item.index[x].replace(day=1, month=1, year=2020)
-            for x in range(len(item.index))
-        ]
+# Zeilen (Kopfbereich), in denen nach Einheiten gesucht wird
+UNIT_ROWS: int = 20
 
 
 # Spalte nach Einheiten durchsuchen
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
-def find_unit(df: pd.DataFrame, col: str) -> str | None:
-    """Einheit für Spalte finden"""
-    unit = None
-    lis_units_low = [u.lower() for u in dics.LIS_UNITS]
+def find_units(df: pd.DataFrame, n_rows: int = UNIT_ROWS) -> dict:
+    """Einheiten aller Spalten finden
+
+    Je Spalte die erste der ersten n_rows Zellen, die (ohne Beachtung von
+    Groß- und Kleinschreibung) in dics.LIS_UNITS steht - sonst None.
+    """
+    if df.empty:
+        return dict.fromkeys(df.columns)
+
+    cells = df.head(n_rows).to_numpy().astype(str)
+    hits = (
+        pd.Series(cells.ravel(order="F"))
+        .str.lower()
+        .isin(dics.SET_UNITS_LOW)
+        .to_numpy()
+        .reshape(len(df.columns), -1)
+    )
+    rows = hits.argmax(axis=1)
 
-    if any(str(x_i).lower() in lis_units_low for x_i in df.loc[:, col]):
-        for u_i in df.loc[:, col]:
-            if str(u_i).lower() in lis_units_low:
-                unit = str(u_i)
-                break
+    return {
+        col: cells[rows[pos], pos] if hits[pos].any() else None
+        for pos, col in enumerate(df.columns)
+    }
 
-    return unit
+
+def find_unit(df: pd.DataFrame, col: str) -> str | None:
+    """Einheit für Spalte finden"""
+    return find_units(df[[col]])[col]
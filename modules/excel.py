@@ -3,38 +3,199 @@ Import und Download von Excel-Dateien
 """
 
 from io import BytesIO
+from itertools import islice
+from operator import itemgetter
 from typing import Any
 
+import numpy as np
+import openpyxl
 import pandas as pd
 import pandas.io.formats.excel
 import streamlit as st
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
 
 from modules import def_dics as dics
 from modules import df_manip as dfm
+from modules import import_cache as ic
 from modules import meteorolog as meteo
+from modules import session_store as sst
 
 pandas.io.formats.excel.ExcelFormatter.header_style = None
 
+MARKER_INDEX = "↓ Index ↓"
+HEADER_MAX_ROWS = 100  # Index-Markierung muss in diesen ersten Zeilen stehen
+CHUNK_ROWS = 10_000  # Zeilen, die auf einmal in Arrays umgewandelt werden
+
+
+def _chunk_values(rows: list) -> np.ndarray:
+    """Zeilen-Block als float64-Array (nicht-numerische Zellen werden NaN)"""
+    try:
+        return np.array(rows, dtype="float64")
+    except (TypeError, ValueError):
+        return (
+            pd.DataFrame(rows).apply(pd.to_numeric, errors="coerce").to_numpy("float64")
+        )
+
+
+def _chunk_index(idx: list) -> np.ndarray:
+    """Index-Block als datetime64-Array (Texte o.ä. bleiben object)"""
+    try:
+        return np.array(idx, dtype="datetime64[ns]")
+    except (TypeError, ValueError):
+        return np.array(idx, dtype="object")
+
+
+def _sheet_header(rows: Any) -> tuple:
+    """Kopfzeilen bis zur Index-Markierung lesen
+
+    Returns:
+        - Spalte des Index
+        - Spalten mit Daten
+        - Spaltenüberschriften
+        - dictionary mit den Einheiten der Spalten
+        - Zeilennummer der Index-Markierung (wie in Excel)
+    """
+    row_units = ()
+    for num, row in enumerate(rows):
+        if MARKER_INDEX in row:
+            break
+        if num >= HEADER_MAX_ROWS:
+            raise ValueError(
+                f'"{MARKER_INDEX}" nicht in den ersten {HEADER_MAX_ROWS} Zeilen'
+            )
+        row_units = row
+    else:
+        raise ValueError(f'"{MARKER_INDEX}" nicht gefunden')
+
+    ind_col = row.index(MARKER_INDEX)
+    pos_cols = [
+        pos for pos in range(ind_col + 1, len(row)) if row[pos] not in (None, "")
+    ]
+    cols = [str(row[pos]) for pos in pos_cols]
+    units = {
+        col: row_units[pos] if pos < len(row_units) else None
+        for col, pos in zip(cols, pos_cols)
+    }
+
+    return ind_col, pos_cols, cols, units, num + 1
+
+
+def _sheet_block(
+    rows: Any, ind_col: int, pos_cols: list, max_rows: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Datenzeilen blockweise in Arrays lesen (alle oder höchstens max_rows)
+
+    Returns:
+        - Index (datetime64 oder object)
+        - Werte (float64, Zeilen x Spalten)
+    """
+    get_values = itemgetter(*pos_cols)
+    width = max(pos_cols) + 1
+
+    lis_idx, lis_val = [], []
+    buf_idx, buf_val = [], []
+    for row in islice(rows, max_rows):
+        if len(row) < width:
+            row = row + (None,) * (width - len(row))
+        buf_idx.append(row[ind_col])
+        buf_val.append(get_values(row))
+        if len(buf_idx) >= CHUNK_ROWS:
+            lis_idx.append(_chunk_index(buf_idx))
+            lis_val.append(_chunk_values(buf_val))
+            buf_idx, buf_val = [], []
+    if buf_idx:
+        lis_idx.append(_chunk_index(buf_idx))
+        lis_val.append(_chunk_values(buf_val))
+
+    return _concat_blocks(lis_idx, lis_val, len(pos_cols))
+
+
+def _concat_blocks(
+    lis_idx: list, lis_val: list, n_cols: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """gelesene Blöcke aneinanderhängen (Index object, wenn ein Block object ist)"""
+    if any(idx.dtype == "object" for idx in lis_idx):
+        lis_idx = [idx.astype("object") for idx in lis_idx]
+
+    index = np.concatenate(lis_idx) if lis_idx else np.empty(0, dtype="datetime64[ns]")
+    values = (
+        np.concatenate(lis_val).reshape(-1, n_cols)
+        if lis_val
+        else np.empty((0, n_cols))
+    )
+
+    return index, values
+
 
 @dics.timer()
-def import_prefab_excel(file: Any) -> None:
-    """vordefinierte Datei (benannte Zelle für Indes) importieren"""
-
-    df = pd.read_excel(file, sheet_name="Daten")
-
-    ind = df[df == "↓ Index ↓"].dropna(how="all").dropna(axis=1)
-    ind_row = ind.index[0]
-    ind_col = df.columns.get_loc(ind.columns[0])
-    df.columns = df.iloc[ind_row]
-    units = df.iloc[ind_row - 1 : ind_row].copy()
-    units = units.reset_index(drop=True)
-    df = df.iloc[ind_row + 1 :, ind_col:]
-    df = df.set_index("↓ Index ↓")
-    pd.to_datetime(df.index, dayfirst=True)
+def stream_prefab_sheet(file: Any, sheet_name: str = "Daten") -> tuple:
+    """Arbeitsblatt zeilenweise lesen (openpyxl read-only)
+
+    Die Index-Markierung wird nur in den ersten Zeilen gesucht,
+    die Daten werden blockweise direkt in float64- bzw. datetime64-Arrays
+    geschrieben, ohne das ganze Blatt als object-Zellen im Speicher zu halten.
+
+    Returns:
+        - DataFrame mit den Daten
+        - dictionary mit den Einheiten der Spalten
+    """
+
+    wkb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wkb[sheet_name].iter_rows(values_only=True)
+        ind_col, pos_cols, cols, units, _ = _sheet_header(rows)
+        index, values = _sheet_block(rows, ind_col, pos_cols)
+    finally:
+        wkb.close()
+
+    df = pd.DataFrame(
+        values,
+        index=pd.Index(index, name=MARKER_INDEX),
+        columns=cols,
+    )
+
+    return df, units
+
+
+def prefab_source(df_raw: pd.DataFrame, dic_tit: dict) -> dict | None:
+    """Angaben zur Quelle für das spätere Erkennen angehängter Zeilen
+
+    Den Hash über das XML der bisherigen Zeilen ("digest") ergänzt
+    read_appended_excel (siehe sheet_digest).
+
+    Args:
+        - df_raw: Daten wie aus dem Arbeitsblatt gelesen (vor dem Bereinigen)
+        - dic_tit: Spaltenüberschrift -> Spaltentitel (übernommene Spalten)
+    """
+    if not isinstance(df_raw.index, pd.DatetimeIndex) or df_raw.index.isna().all():
+        return None
+
+    return {
+        # leere Zeilen am Ende zählen nicht - dort wird weitergeschrieben
+        "rows": int(np.flatnonzero(df_raw.index.notna())[-1]) + 1,
+        "first": str(df_raw.index.to_numpy()[0]),
+        "cols": list(df_raw.columns),
+        "tit": dic_tit,
+        "digest": None,
+    }
+
+
+@dics.timer()
+def read_prefab_excel(file: Any) -> tuple[pd.DataFrame, dict, pd.DataFrame]:
+    """vordefinierte Datei (benannte Zelle für Index) einlesen"""
+
+    return prefab_from_raw(*stream_prefab_sheet(file, "Daten"))
+
+
+@dics.timer()
+def prefab_from_raw(
+    df_raw: pd.DataFrame, units: dict
+) -> tuple[pd.DataFrame, dict, pd.DataFrame]:
+    """gelesene Daten einer vordefinierten Datei bereinigen, Metadaten erzeugen"""
+
+    df = df_raw[df_raw.index.notna()]
     df.dropna(how="all", inplace=True)
     df.dropna(axis="columns", how="all", inplace=True)
-    units.dropna(how="all", inplace=True)
-    units.dropna(axis="columns", how="all", inplace=True)
     if not isinstance(df.index, pd.DatetimeIndex) and "01.01. " in df.index[0]:
         df.index = pd.to_datetime(
             [x.split()[0] + "2020 " + x.split()[1] for x in df.index.values],
@@ -43,13 +204,14 @@ def import_prefab_excel(file: Any) -> None:
 
     dic_meta = dfm.cols_meta(df)
     for col in df.columns:
-        if units[col][0] not in ["", None]:
-            dic_meta[col]["unit_data"] = " " + units[col][0]
+        if units.get(col) not in ["", None]:
+            dic_meta[col]["unit_data"] = " " + str(units[col])
             dic_meta[col]["unit_graph"] = (
-                " kW" if units[col][0] in ["kWh", "kwh", "KWH"] else " " + units[col][0]
+                " kW" if units[col] in ["kWh", "kwh", "KWH"] else " " + str(units[col])
             )
 
     dic_meta["index"] = {"datetime": False}
+    df_deleted = df.iloc[0:0].copy()
     if isinstance(df.index, pd.DatetimeIndex):
         df.index = df.index.round("s")
         dic_meta["index"] = {"datetime": True}
@@ -58,13 +220,233 @@ def import_prefab_excel(file: Any) -> None:
             dic_meta["index"]["td_int"] = "15min"
         elif dic_meta["index"]["td_mean"] == pd.Timedelta(hours=1):
             dic_meta["index"]["td_int"] = "h"
-        st.session_state["df_dls_deleted"] = df[df.index.duplicated(keep="first")]
+        df_deleted = df[df.index.duplicated(keep="first")]
         df = df[~df.index.duplicated(keep="first")]
-    for col in df.columns:
-        tit = dic_meta.get(col).get("tit")
+    dic_tit = {col: dic_meta.get(col).get("tit") for col in df.columns}
+    for col, tit in dic_tit.items():
         df.rename(columns={col: tit}, inplace=True)
         dic_meta[tit] = dic_meta.pop(col)
+
+    if dic_meta["index"]["datetime"]:
+        dic_meta["index"]["source"] = prefab_source(df_raw, dic_tit)
+
+    return df, dic_meta, df_deleted
+
+
+class _TailSheet(ReadOnlyWorksheet):
+    """Arbeitsblatt ab einer Stelle im XML (read-only)
+
+    openpyxl bekommt nur den Kopf des Blatts und die Zeilen ab pos -
+    die Zeilen davor werden nicht umgewandelt.
+    """
+
+    def __init__(self, sheet: ReadOnlyWorksheet, xml: bytes, pos: int) -> None:
+        end = xml.find(b"</sheetData>", pos)
+        self._xml = b"".join(
+            (
+                xml[: xml.find(b"<sheetData")],
+                b"<sheetData>",
+                xml[pos : max(end, pos)],
+                b"</sheetData></worksheet>",
+            )
+        )
+        # pylint: disable=protected-access
+        super().__init__(
+            sheet.parent, sheet.title, sheet._worksheet_path, sheet._shared_strings
+        )
+
+    def _get_source(self) -> BytesIO:
+        return BytesIO(self._xml)
+
+
+def _sheet_xml(sheet: ReadOnlyWorksheet) -> bytes:
+    """XML eines Arbeitsblatts (nur entpackt, nicht umgewandelt)"""
+    # pylint: disable=protected-access
+    with sheet._get_source() as src:
+        return src.read()
+
+
+def _row_end(xml: bytes, row: int) -> int:
+    """Stelle hinter einer Zeile im XML des Arbeitsblatts (-1, wenn sie fehlt)"""
+    start = xml.find(b'<row r="%d"' % row)
+    end = xml.find(b"</row>", start) if start >= 0 else -1
+
+    return end + len(b"</row>") if end >= 0 else -1
+
+
+def _source_digest(xml: bytes, row_marker: int, rows: int) -> str | None:
+    """Hash über die Zeilen im XML bis zur letzten bisherigen Zeile
+    (ohne den Kopf des Blatts - dort ändert sich z.B. der Zellbereich)"""
+    end = _row_end(xml, row_marker + rows)
+    if end < 0:
+        return None
+
+    return ic.sheet_digest(memoryview(xml)[xml.find(b"<sheetData") : end])
+
+
+@dics.timer()
+def read_appended_excel(file: Any) -> tuple:
+    """Datei einlesen - verlängert sie eine bereits importierte Datei um
+    Zeilen, werden nur die neuen Zeilen gelesen
+
+    Erkannt wird das über gleiche Spalten, gleichen ersten Zeitstempel und
+    gleichen Hash über das XML des Arbeitsblatts bis zur letzten bisherigen
+    Zeile (siehe prefab_source). Das XML wird dafür nur entpackt und als Text
+    durchsucht; openpyxl wandelt nur die neuen Zeilen um. Passt keine Datei
+    im Zwischenspeicher, wird das Arbeitsblatt einmal ganz gelesen.
+
+    Returns:
+        - df, dic_meta, df_deleted
+        - dictionary mit abgeleiteten dfs (nur beim Anhängen, siehe append_rows)
+    """
+
+    wkb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = wkb["Daten"]
+        xml = _sheet_xml(sheet)
+        rows = sheet.iter_rows(values_only=True)
+        ind_col, pos_cols, cols, units, row_marker = _sheet_header(rows)
+        idx_first, val_first = _sheet_block(rows, ind_col, pos_cols, max_rows=1)
+
+        found = None
+        if idx_first.dtype.kind == "M" and not np.isnat(idx_first).all():
+            found = ic.find_prefix(cols, str(idx_first[0]))
+
+        # nur die neuen Zeilen lesen
+        if found is not None and found[1].get("digest") is not None:
+            source = found[1]
+            if _source_digest(xml, row_marker, source["rows"]) == source["digest"]:
+                idx_new, val_new = _sheet_block(
+                    _TailSheet(
+                        sheet, xml, _row_end(xml, row_marker + source["rows"])
+                    ).iter_rows(
+                        min_row=row_marker + source["rows"] + 1, values_only=True
+                    ),
+                    ind_col,
+                    pos_cols,
+                )
+                appended = append_rows(found, cols, idx_new, val_new)
+                if appended is not None:
+                    source = appended[1]["index"]["source"]
+                    source["digest"] = _source_digest(xml, row_marker, source["rows"])
+                    return appended
+
+        idx_rest, val_rest = _sheet_block(rows, ind_col, pos_cols)
+    finally:
+        wkb.close()
+
+    index, values = _concat_blocks(
+        [idx_first, idx_rest], [val_first, val_rest], len(pos_cols)
+    )
+    df, dic_meta, df_deleted = prefab_from_raw(
+        pd.DataFrame(values, index=pd.Index(index, name=MARKER_INDEX), columns=cols),
+        units,
+    )
+    if dic_meta["index"].get("source"):
+        source = dic_meta["index"]["source"]
+        source["digest"] = _source_digest(xml, row_marker, source["rows"])
+
+    return df, dic_meta, df_deleted, {}
+
+
+# pylint: disable=too-many-locals
+def append_rows(
+    found: tuple, cols: list, idx_new: np.ndarray, val_new: np.ndarray
+) -> tuple | None:
+    """neue Zeilen an eine Datei im Zwischenspeicher anhängen
+
+    Nur die neuen Zeilen werden bereinigt und angehängt, gespeicherte
+    abgeleitete dfs (Stunden-, Monatswerte, Jahresdauerlinie) fortgeschrieben.
+
+    Args:
+        - found: key und Angaben zur Quelle (siehe import_cache.find_prefix)
+        - cols: Spaltenüberschriften
+        - idx_new, val_new: Index und Werte der neuen Zeilen
+
+    Returns:
+        - None, wenn die neuen Zeilen nicht angehängt werden können
+        - sonst: df, dic_meta, df_deleted, dictionary mit abgeleiteten dfs
+    """
+    key_base, source = found
+    cached = ic.load(key_base)
+    if cached is None or idx_new.dtype.kind != "M" or np.isnat(idx_new).all():
+        return None
+    df_base, dic_meta, df_deleted = cached
+
+    df_new = pd.DataFrame(
+        val_new, index=pd.Index(idx_new, name=MARKER_INDEX), columns=cols
+    )
+    df_new = df_new[df_new.index.notna()].dropna(how="all")
+    if (
+        df_new.empty
+        or df_new.drop(columns=list(source["tit"])).notna().to_numpy().any()
+    ):
+        return None
+    df_new = df_new[list(source["tit"])].rename(columns=source["tit"])
+    df_new.index = df_new.index.round("s")
+    if df_new.index[0] <= df_base.index[-1]:
+        return None
+
+    df_deleted = pd.concat([df_deleted, df_new[df_new.index.duplicated(keep="first")]])
+    df_new = df_new[~df_new.index.duplicated(keep="first")]
+    df = pd.concat([df_base, df_new])
+
+    # mittlerer Zeitschritt = Gesamtdauer / Anzahl der Schritte
+    td_mean = ((df.index[-1] - df.index[0]) / (len(df) - 1)).round("min")
+    dic_products = {}
+    if td_mean == dic_meta["index"]["td_mean"]:
+        dic_products, _ = dfm.append_products(
+            ic.load_products(key_base), df, dic_meta, df_new.index[0]
+        )
+    dic_meta["index"]["td_mean"] = td_mean
+    dic_meta["index"].pop("td_int", None)
+    if td_mean == pd.Timedelta(minutes=15):
+        dic_meta["index"]["td_int"] = "15min"
+    elif td_mean == pd.Timedelta(hours=1):
+        dic_meta["index"]["td_int"] = "h"
+
+    dic_meta["index"]["source"] = {
+        **source,
+        "rows": source["rows"] + int(np.flatnonzero(~np.isnat(idx_new))[-1]) + 1,
+        "digest": None,
+    }
+
+    return df, dic_meta, df_deleted, dic_products
+
+
+@dics.timer()
+def import_prefab_excel(file: Any) -> None:
+    """vordefinierte Datei (benannte Zelle für Index) importieren
+
+    Bereits bekannte Dateien (gleicher Inhalt) werden aus dem
+    Zwischenspeicher geladen statt neu eingelesen.
+    """
+
+    key = ic.file_hash(file)
+    cached = ic.load(key)
+    if cached is not None:
+        df, dic_meta, df_deleted = cached
+        dic_products = ic.load_products(key)
+    else:
+        df, dic_meta, df_deleted, dic_products = read_appended_excel(file)
+        ic.save(key, df, dic_meta, df_deleted)
+        ic.save_products(key, dic_products)
+
+    # abgeleitete dfs übernehmen (Metadaten wie bei dfm.h_from_other)
+    if dic_products:
+        cols = [col for col in df.columns if col != "orgidx"]
+        for col, upd in dfm.meta_h(cols, dic_meta).items():
+            dic_meta.setdefault(col, {}).update(upd)
+    for name, df_product in dic_products.items():
+        sst.put(name, df_product)
+
+    # Ausreißerbereinigung gehört zur vorherigen Datei
+    sst.delete("df_outl_raw")
+    dics.del_session_state_entry("df_outl_report")
+
     df["orgidx"] = df.index.copy()
+    st.session_state["import_key"] = key
+    st.session_state["df_dls_deleted"] = df_deleted
     st.session_state["dic_meta"] = dic_meta
     st.session_state["df"] = df
     if "lis_years" not in st.session_state:
@@ -80,6 +462,33 @@ def import_prefab_excel(file: Any) -> None:
         st.session_state["lis_years"] = lis_years
 
 
+@dics.timer()
+def cache_products() -> None:
+    """abgeleitete dfs (Stunden-, Monatswerte, Jahresdauerlinie) zur importierten
+    Datei im Zwischenspeicher ablegen (nur Spalten aus der Datei)"""
+
+    key = st.session_state.get("import_key")
+    source = st.session_state["dic_meta"]["index"].get("source")
+    if key is None or source is None:
+        return
+
+    tits = set(source["tit"].values())
+    dic_products = {}
+    for name in ic.PRODUCTS:
+        if sst.has(name):
+            df = sst.get(name)
+            dic_products[name] = df[
+                [
+                    col
+                    for col in df.columns
+                    if col == "orgidx"
+                    or col.replace("_orgidx", "").replace(" *h", "") in tits
+                ]
+            ]
+
+    ic.save_products(key, dic_products)
+
+
 @dics.timer()
 # pylint: disable=too-many-locals
 def excel_download(df: pd.DataFrame, page: str = "graph") -> Any:
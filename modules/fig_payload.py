@@ -0,0 +1,109 @@
+"""
+Grafiken kompakt übertragen (st.plotly_chart, html-Export)
+
+Plotly schreibt float64-Werte als JSON-Text mit bis zu 17 Stellen und
+Zeitstempel einzeln über datetime.isoformat. encode liefert die Grafik
+als dictionary mit:
+
+- Werten auf die Nachkommastellen des hovers plus eine gerundet
+  (siehe plotly_plots.hover_format), mindestens aber auf SIG_DIGITS
+  signifikante Stellen des größten Betrags der Linie
+- Zeitstempeln als kurzer Text ("2020-01-01T00:15"), in einem Aufruf
+  für das ganze Array
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from modules import def_dics as dics
+from modules import plotly_plots as ploplo
+
+# Nachkommastellen zusätzlich zum hover
+DECIMALS_EXTRA: int = 1
+
+# signifikante Stellen, die beim Runden mindestens erhalten bleiben
+SIG_DIGITS: int = 4
+
+# Arrays einer Linie, die kodiert werden
+ARRAYS = ("x", "y", "customdata")
+
+
+def decimals(values: np.ndarray) -> int | None:
+    """Nachkommastellen, auf die eine Linie gerundet werden kann
+
+    Nachkommastellen des hovers plus DECIMALS_EXTRA - bei kleinen Beträgen
+    mehr, damit SIG_DIGITS signifikante Stellen des größten Betrags bleiben.
+    None (nicht runden), wenn das mehr Stellen wären, als float64 hat.
+    """
+    n_dec = int(ploplo.hover_format(values)[-2]) + DECIMALS_EXTRA
+
+    val_abs = np.abs(values.astype("float64"))
+    val_max = np.nanmax(val_abs, initial=0, where=np.isfinite(val_abs))
+    if val_max > 0:
+        n_dec = max(n_dec, SIG_DIGITS - 1 - int(np.floor(np.log10(val_max))))
+
+    return n_dec if n_dec <= np.finfo("float64").precision else None
+
+
+def encode_array(values: np.ndarray, values_y: bool = False) -> np.ndarray:
+    """ein Array einer Linie kodieren
+
+    Gerundet werden nur die y-Werte (siehe decimals), Zeitstempel ohne
+    Zeitzone werden Text (auf die Minute, wenn keine Sekunden vorkommen),
+    alles andere bleibt.
+    """
+    if values.size == 0:
+        return values
+
+    if values_y and values.dtype.kind in "fiu":
+        n_dec = decimals(values)
+        return values if n_dec is None else np.round(values, n_dec)
+
+    if values.dtype.kind == "M" or isinstance(values[0], datetime.datetime):
+        stamps = pd.DatetimeIndex(values)
+        if stamps.tz is None and not (stamps.microsecond != 0).any():
+            unit = "s" if (stamps.second != 0).any() else "m"
+            return np.datetime_as_string(stamps.to_numpy(), unit=unit)
+
+    return values
+
+
+@dics.timer()
+def encode(fig: go.Figure) -> dict:
+    """Grafik als dictionary mit kodierten Arrays
+
+    Im html-Export wird das dictionary nicht mehr von plotly.py geprüft
+    (pio.to_json / pio.to_html mit validate=False). st.plotly_chart prüft
+    und serialisiert es weiterhin - dort bringt encode nur das kleinere JSON.
+    """
+    dic_fig = fig.to_dict()
+    for dic_trace in dic_fig["data"]:
+        for key in ARRAYS:
+            if isinstance(dic_trace.get(key), np.ndarray):
+                dic_trace[key] = encode_array(dic_trace[key], key == "y")
+
+    return dic_fig
+
+
+def to_json(fig: go.Figure) -> str:
+    """kodierte Grafik als JSON-Text"""
+    return pio.to_json(encode(fig), validate=False)
+
+
+def to_html(fig: go.Figure, config: dict, include_plotlyjs: bool = True) -> str:
+    """kodierte Grafik als html-Schnipsel (full_html=False)
+
+    include_plotlyjs nur für die erste Grafik einer Seite - plotly.js
+    (ca. 3,5 MB) muss nur einmal in der Datei stehen.
+    """
+    return pio.to_html(
+        encode(fig),
+        config=config,
+        full_html=False,
+        include_plotlyjs=include_plotlyjs,
+        validate=False,
+    )
@@ -2,8 +2,11 @@
 Einstellungen und Anmerkungen für plots
 """
 
+import hashlib
 import os
+from collections import Counter
 from datetime import datetime
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -12,7 +15,11 @@ import streamlit as st
 from scipy import signal
 
 from modules import def_dics as dics
+from modules import df_manip as dfm
+from modules import fig_payload as payload
 from modules import global_variables as gv
+from modules import plotly_plots as ploplo
+from modules import session_store as sst
 
 gv.exclude = ("hline", "(glatt)")
 
@@ -20,6 +27,17 @@ HALFDAY_MS = 12 * 60 * 60 * 1000  # 43.200.000
 WEEK_MS = 7 * 24 * 60 * 60 * 1000  # 604.800.000
 MON_MS = 30 * 24 * 60 * 60 * 1000  # 2.592.000.000
 
+# dfs, aus denen die Grafiken erzeugt werden - ein Jahr / mehrere Jahre
+# übereinander ("df": Stundenwerte oder Originaldaten, siehe fig_source)
+FIG_DATA = {
+    "fig_base": ("df", "dic_df_multi"),
+    "fig_jdl": ("df_jdl", "dic_jdl"),
+    "fig_mon": ("df_mon", "dic_mon"),
+}
+
+# Speicher für Glättungen je Sitzung (siehe savgol_cached)
+SMOOTH_CACHE_MAX_BYTES: int = int(os.getenv("SMOOTH_CACHE_MAX_MB", "100")) * 1024**2
+
 
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
@@ -75,11 +93,10 @@ def update(
 ) -> go.Figure:
     """Aussehen der Grafik anpassen"""
 
-    if x_max is None:
-        x_max = max(max(p["x"]) for p in fig.data)
-
-    if x_min is None:
-        x_min = min(min(p["x"]) for p in fig.data)
+    if x_min is None or x_max is None:
+        ext_min, ext_max = fig_extent(fig)
+        x_min = ext_min if x_min is None else x_min
+        x_max = ext_max if x_max is None else x_max
 
     amo_y = len(fig.layout.meta.get("units"))
 
@@ -228,9 +245,9 @@ def add_arrow(
     anker_input = anker
 
     # Mitte der x-Achse
-    x_max = max(max(dat["x"]) for dat in fig.data if len(dat["x"]) > 0)
-    x_min = min(min(dat["x"]) for dat in fig.data if len(dat["x"]) > 0)
+    x_min, x_max = fig_extent(fig)
     middle_x = x_min + (x_max - x_min) / 2
+    lis_stats = fig_stats(fig)
 
     # alle Linien in Grafik
     lis_lines = [
@@ -265,9 +282,10 @@ def add_arrow(
                 manip = -1 if any(x in line for x in dics.LIS_NEG) else 1
 
             if a_type == "peak":
-                dat = [x for x in fig.data if x.name == line][0]
-                wert_y = max(dat["y"]) if manip > 0 else min(dat["y"])
-                wert_x = dat["x"][np.where(dat["y"] == wert_y)[0][0]]
+                pos_dat = [pos for pos, x in enumerate(fig.data) if x.name == line][0]
+                peak = lis_stats[pos_dat]["max" if manip > 0 else "min"]
+                wert_y = peak["y"]
+                wert_x = peak["x"]
 
             if txt_input is None:
                 txt = (
@@ -289,7 +307,7 @@ def add_arrow(
                 hovtxt = f"{wert_x:%d.%m.%Y %H:%M}"
 
             if hovtxt_input is None and "Jahresdauerlinie" in fig.layout.meta["title"]:
-                hovtxt = dat["customdata"][np.where(dat["y"] == wert_y)[0][0]]
+                hovtxt = peak["customdata"]
                 hovtxt = f"{hovtxt:%d.%m.%Y %H:%M}"
 
             lis_add_anno.append(
@@ -332,6 +350,132 @@ def add_arrow(
     return fig
 
 
+def fig_range(df: pd.DataFrame) -> tuple:
+    """im Lastgang dargestellter Zeitraum (Auswahl "di_range", sonst alles)"""
+    di_range = st.session_state.get("di_range")
+    if not di_range or len(di_range) != 2:
+        di_range = (df.index[0].date(), df.index[-1].date())
+
+    return str(di_range[0]), str(di_range[1])
+
+
+def fig_source(figure: str, whole: bool = False) -> dict:
+    """Linien einer Grafik in voller Auflösung
+
+    Die Linien in den Grafiken sind nur für die Darstellung ausgedünnt
+    (Auflösungsstufen, plotly_plots.minmax_indices). Was nicht zeichnet
+    (Excel-Export, Pfeile an Maximum und Minimum, Glättung), liest die Werte
+    aus den dfs, aus denen die Grafik erzeugt wurde - im Lastgang nur den
+    dargestellten Zeitraum (fig_range), mit whole=True alles.
+    Linien ohne Quelle (Tagesvergleich, hline, geglättete Linien) fehlen.
+
+    Returns:
+        - {Name der Linie: (Werte wie gezeichnet, customdata)}
+            (Werte mit Vorzeichen wie in plotly_plots, siehe dics.LIS_NEG)
+    """
+    if figure not in FIG_DATA:
+        return {}
+
+    multi = bool(st.session_state.get("cb_multi_year"))
+    name = FIG_DATA[figure][multi]
+    if name == "df":
+        data = (
+            sst.get("df_h")
+            if st.session_state.get("cb_h")
+            else st.session_state.get("df")
+        )
+    else:
+        data = sst.get(name)
+    if data is None:
+        return {}
+    if name == "df" and not whole and isinstance(data.index, pd.DatetimeIndex):
+        data = data.loc[slice(*fig_range(data))]
+
+    dic_meta = st.session_state["dic_meta"]
+    dic_source = {}
+    for year, df in (data if multi else {None: data}).items():
+        for col in df.columns:
+            if "orgidx" in col or col not in dic_meta:
+                continue
+            manip = -1 if any(True for x in col.split() if x in dics.LIS_NEG) else 1
+            cusd = (
+                df[f"{col}_orgidx"] if f"{col}_orgidx" in df.columns else df["orgidx"]
+            )
+            tit = dic_meta[col].get("tit") + ("" if year is None else f" {year}")
+            dic_source[tit] = (df[col] * manip, cusd)
+
+    return dic_source
+
+
+def fig_name(fig: go.Figure) -> str | None:
+    """Name einer Grafik in st.session_state (None für andere Grafiken)"""
+    return next((key for key in dfm.FIGS if st.session_state.get(key) is fig), None)
+
+
+def trace_key(trace: Any, figure: str | None) -> str:
+    """Schlüssel einer Linie (im Tagesvergleich heißen die Linien nach dem Tag)"""
+    return f"{trace.legendgroup} {trace.name}" if figure == "fig_days" else trace.name
+
+
+def fig_stats(fig: go.Figure) -> list:
+    """Kennwerte aller Linien einer Grafik (siehe plotly_plots.trace_stats)
+
+    Liste in der Reihenfolge von fig.data. Für Grafiken in st.session_state
+    zwischengespeichert in st.session_state["fig_stats"] (je Grafik und Linie),
+    fehlende Kennwerte werden berechnet: Länge und Bereich x aus der
+    gezeichneten Linie, Maximum und Minimum aus den Daten in voller Auflösung
+    im dargestellten Zeitraum (fig_source, "len_data": Anzahl der Werte dort).
+    """
+    figure = fig_name(fig)
+    dic_stats = (
+        st.session_state.setdefault("fig_stats", {}).setdefault(figure, {})
+        if figure
+        else {}
+    )
+
+    dic_source = None
+    lis_stats = []
+    for trace in fig.data:
+        key = trace_key(trace, figure)
+        if key not in dic_stats:
+            if dic_source is None:
+                dic_source = fig_source(figure) if figure else {}
+            stats = ploplo.trace_stats(trace.x, trace.y, trace.customdata)
+            stats["len_data"] = stats["len"]
+            if trace.name in dic_source:
+                values, cusd = dic_source[trace.name]
+                stats.update(ploplo.trace_peaks(values.index, values, cusd))
+                stats["len_data"] = len(values)
+            dic_stats[key] = stats
+        lis_stats.append(dic_stats[key])
+
+    return lis_stats
+
+
+def reset_stats(figure: str) -> None:
+    """Kennwerte einer Grafik löschen (nach dem Erstellen der Grafik)"""
+    st.session_state.get("fig_stats", {}).pop(figure, None)
+
+
+def fig_extent(fig: go.Figure) -> tuple:
+    """kleinster und größter x-Wert aller Linien einer Grafik"""
+    lis_stats = [sta for sta in fig_stats(fig) if sta["len"] > 0]
+
+    return (
+        min(sta["x_min"] for sta in lis_stats),
+        max(sta["x_max"] for sta in lis_stats),
+    )
+
+
+def set_y(fig: go.Figure, trace: go.Scatter, values: Any) -> None:
+    """y-Werte einer Linie ersetzen (ihre Kennwerte werden neu berechnet)"""
+    trace.y = values
+    figure = fig_name(fig)
+    st.session_state.get("fig_stats", {}).get(figure, {}).pop(
+        trace_key(trace, figure), None
+    )
+
+
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def arrows_min_max(figure: str) -> None:
@@ -343,20 +487,29 @@ def arrows_min_max(figure: str) -> None:
     fig = st.session_state[figure]
 
     # Mitte der x-Achse
-    x_max = max(max(dat["x"]) for dat in fig.data if len(dat["x"]) > 0)
-    x_min = min(min(dat["x"]) for dat in fig.data if len(dat["x"]) > 0)
+    x_min, x_max = fig_extent(fig)
     mid_x = x_min + (x_max - x_min) / 2
 
     # alle Linien in Grafik
+    # (Maximum und Minimum aus den Daten in voller Auflösung, siehe fig_stats)
     lis_lines = [
-        line for line in fig.data if all(e not in line.name for e in gv.exclude)
+        (line, stats)
+        for line, stats in zip(fig.data, fig_stats(fig))
+        if all(e not in line.name for e in gv.exclude)
     ]
 
-    for line in lis_lines:
+    # Pfeile über ihren Namen finden und am Ende alle auf einmal setzen
+    # (jedes add_annotation / update prüft das ganze layout)
+    lis_annot = [annot.to_plotly_json() for annot in fig.layout.annotations]
+    dic_annot = {annot["name"]: annot for annot in lis_annot if annot.get("name")}
+    for line, stats in lis_lines:
         manip = -1 if any(x in line.name for x in dics.LIS_NEG) else 1
 
-        val_y = np.nanmax(line.y) if manip > 0 else np.nanmin(line.y)
-        val_x = line.x[np.where(line.y == val_y)[0][0]]
+        peak = stats["max" if manip > 0 else "min"]
+        if peak is None:
+            continue
+        val_y = peak["y"]
+        val_x = peak["x"]
         yaxis = line.yaxis
         anc = "right" if val_x > mid_x else "left"
 
@@ -366,41 +519,38 @@ def arrows_min_max(figure: str) -> None:
             f'{st.session_state["dic_meta"][line.name].get("unit_graph")}'
         )
 
+        hovertext = None
         if isinstance(val_x, datetime):
             hovertext = f"{val_x:%d.%m. %H:%M}"
 
         if "Jahresdauerlinie" in fig.layout.meta["title"]:
-            val = line.customdata[np.where(line.y == val_y)[0][0]]
+            val = peak["customdata"]
             hovertext = f"{val:%d.%m. %H:%M}"
 
-        if text in [an.name for an in fig.layout.annotations]:
-            fig.layout.annotations[text] = {
-                "x": val_x,
-                "y": val_y,
-                "yref": yaxis,
-                "name": text,
-                "text": text,
-                "hovertext": hovertext,
-                "xanchor": anc,
-                "ax": -a_x if anc == "right" else a_x,
-                "ay": a_y * manip,
-            }
+        dic_pos = {
+            "x": val_x,
+            "y": val_y,
+            "yref": yaxis,
+            "name": text,
+            "text": text,
+            "hovertext": hovertext,
+            "xanchor": anc,
+            "ax": -a_x if anc == "right" else a_x,
+            "ay": a_y * manip,
+        }
+        if text in dic_annot:
+            dic_annot[text].update(dic_pos)
         else:
-            fig.add_annotation(
-                x=val_x,
-                y=val_y,
-                yref=yaxis,
-                name=text,
-                text=text,
-                hovertext=hovertext,
-                xanchor=anc,
-                ax=-a_x if anc == "right" else a_x,
-                ay=a_y * manip,
-                showarrow=True,
-                arrowhead=3,
-                bgcolor="rgba(" + dics.FARBEN["weiß"] + dics.ALPHA["bg"],
-                visible=False,
-            )
+            dic_annot[text] = {
+                **dic_pos,
+                "showarrow": True,
+                "arrowhead": 3,
+                "bgcolor": "rgba(" + dics.FARBEN["weiß"] + dics.ALPHA["bg"],
+                "visible": False,
+            }
+            lis_annot.append(dic_annot[text])
+
+    fig.layout.annotations = lis_annot
 
 
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
@@ -501,14 +651,14 @@ def hline_fill(fig: go.Figure, value: float, ms_hor: list) -> go.Figure:
     for key in dic_fill:
         if "hline " + key in [tr.name for tr in fig.data]:
             trace = [tr for tr in fig.data if tr.name == "hline " + key][0]
-            trace.y = dic_fill[trace.name.replace("hline ", "")]
+            set_y(fig, trace, dic_fill[trace.name.replace("hline ", "")])
             trace.showlegend = False
             trace.visible = True
 
         else:
             trace = [tr for tr in fig.data if tr.name == key][0]
             fig.add_trace(
-                go.Scatter(
+                ploplo.scatter_type(len(trace.x))(
                     x=trace.x,
                     y=dic_fill[trace.name],
                     legendgroup=trace.legendgroup,
@@ -551,35 +701,125 @@ def h_v_lines() -> None:
             # )
 
 
+def savgol_rows(arr: np.ndarray, window: int, degree: int) -> np.ndarray:
+    """Savitzky-Golay-Filter für mehrere gleich lange Linien (Zeilen) auf einmal
+
+    Gleiche Werte wie signal.savgol_filter(mode="mirror"), aber als Faltung
+    über FFT - die Fenster der Originaldaten (bis zu einem Drittel der Linie)
+    wären direkt gefaltet zu langsam.
+    Lücken werden vorher mit akima gefüllt (siehe df_manip.akima_gaps),
+    Lücken am Anfang und Ende bleiben Lücken.
+    """
+    window = min(window, arr.shape[1] - 1 + arr.shape[1] % 2)
+    if window <= degree:
+        return arr
+
+    nan = np.isnan(arr)
+    if nan.any():
+        arr = np.array([dfm.akima_gaps(row) for row in arr])
+        nan = np.isnan(arr)
+        for row, row_nan in zip(arr, nan):
+            if row_nan.any() and not row_nan.all():
+                valid = np.flatnonzero(~row_nan)
+                row[row_nan] = np.interp(np.flatnonzero(row_nan), valid, row[valid])
+
+    half = window // 2
+    arr_glatt = signal.oaconvolve(
+        np.pad(arr, ((0, 0), (half, half)), mode="reflect"),
+        signal.savgol_coeffs(window, degree)[np.newaxis, :],
+        mode="valid",
+        axes=1,
+    )
+    arr_glatt[nan] = np.nan
+
+    return arr_glatt
+
+
+def savgol_cached(arr: np.ndarray, window: int, degree: int) -> np.ndarray:
+    """savgol_rows mit Zwischenspeicher je Sitzung (Hash der Daten, Fenster, Grad)
+
+    Ein Zurückstellen der Regler auf eine frühere Einstellung ist dadurch sofort da.
+    Die ältesten Glättungen fallen raus, wenn SMOOTH_CACHE_MAX_BYTES voll ist.
+    """
+    key = (
+        hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest(),
+        arr.shape,
+        window,
+        degree,
+    )
+    cache = st.session_state.setdefault("smooth_cache", {})
+    if key in cache:
+        cache[key] = cache.pop(key)
+        return cache[key]
+
+    cache[key] = savgol_rows(arr, window, degree)
+    while len(cache) > 1 and (
+        sum(val.nbytes for val in cache.values()) > SMOOTH_CACHE_MAX_BYTES
+    ):
+        cache.pop(next(iter(cache)))
+
+    return cache[key]
+
+
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
-def smooth(fig: go.Figure) -> None:
-    """geglättete Linien"""
+def smooth(fig: str) -> None:
+    """geglättete Linien (alle gleich langen Linien in einem Aufruf)
 
-    lis_trace = [
-        trace
-        for trace in st.session_state[fig].data
-        if all(n not in gv.exclude for n in trace.name.split())
-    ]
+    Geglättet werden die Daten in voller Auflösung im dargestellten Zeitraum
+    (fig_source, Fenster in Datenpunkten), erst das Ergebnis wird für die
+    Darstellung auf die Anzahl Punkte der gezeichneten Linie ausgedünnt.
+    """
 
-    for trace in lis_trace:
+    window = int(st.session_state["gl_win"])
+    degree = int(st.session_state["gl_deg"])
+    n_points = st.session_state.get("ni_points", ploplo.MAX_POINTS)
 
-        y_glatt = signal.savgol_filter(
-            x=pd.Series(trace["y"]).interpolate("akima"),
-            mode="mirror",
-            window_length=int(st.session_state["gl_win"]),
-            polyorder=int(st.session_state["gl_deg"]),
+    dic_glatt = {
+        trace.name: trace
+        for trace in st.session_state[fig].data
+        if trace.name.endswith(" (glatt)")
+    }
+    dic_source = fig_source(fig)
+    dic_len = {}
+    for trace, stats in zip(
+        st.session_state[fig].data, fig_stats(st.session_state[fig])
+    ):
+        if all(n not in gv.exclude for n in trace.name.split()):
+            values = (
+                dic_source[trace.name][0]
+                if trace.name in dic_source
+                else pd.Series(np.asarray(trace["y"], dtype="float64"), trace["x"])
+            )
+            dic_len.setdefault(len(values), []).append((trace, stats, values))
+
+    for lis_trace in dic_len.values():
+        arr_glatt = savgol_cached(
+            np.array([val.to_numpy(dtype="float64") for _, _, val in lis_trace]),
+            window,
+            degree,
         )
 
-        if trace.name + " (glatt)" not in [
-            tr.name for tr in st.session_state[fig].data
-        ]:
+        for (trace, stats, values), y_glatt in zip(lis_trace, arr_glatt):
+            # Anzahl Punkte der gezeichneten Linie
+            pos = ploplo.minmax_indices(y_glatt, stats["len"] or n_points)
+            x_glatt, y_glatt = values.index[pos], y_glatt[pos]
+
+            if trace.name + " (glatt)" in dic_glatt:
+                dic_glatt[trace.name + " (glatt)"].x = x_glatt
+                set_y(
+                    st.session_state[fig], dic_glatt[trace.name + " (glatt)"], y_glatt
+                )
+                continue
+
+            # WebGL kennt keine Strichlänge in %
+            scatter = ploplo.scatter_type(len(x_glatt))
             st.session_state[fig].add_trace(
-                go.Scatter(
-                    x=trace["x"],
+                scatter(
+                    x=x_glatt,
                     y=y_glatt,
                     mode="lines",
-                    line_dash="0.75%",
+                    line_dash="dot" if scatter is go.Scattergl else "0.75%",
                     name=trace.name + " (glatt)",
                     legendgroup=trace.legendgroup or "geglättet",
                     legendgrouptitle_text=trace.legendgroup or "geglättet",
@@ -589,32 +829,6 @@ def smooth(fig: go.Figure) -> None:
                 )
             )
 
-        else:
-            for dat in st.session_state[fig].data:
-                if dat.name == trace.name + " (glatt)":
-                    dat["y"] = y_glatt
-                    break
-
-
-# Ausreißer entfernen
-# @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
-@dics.timer()
-def remove_outl(fig: go.Figure, cut_off: float) -> go.Figure:
-    """Ausreißerbereinigung"""
-    for trace in fig.data:
-        trace["y"] = pd.Series(
-            np.where(trace["y"] > cut_off, np.nan, trace["y"])
-        ).interpolate("akima")
-
-    for annot in fig.layout.annotations:
-        if annot["y"] > cut_off:
-            y_old = annot["y"]
-            annot["y"] = cut_off
-            # an['name'] = an['name'].replace(str(y_old), str(cut_off))
-            annot["text"] = annot["text"].replace(str(y_old), str(cut_off))
-
-    return fig
-
 
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
@@ -634,19 +848,6 @@ def add_points(fig: go.Figure, df: pd.DataFrame, lines: list) -> None:
         )
 
 
-# Ausreißerbereinigung
-@dics.timer()
-def clean_outliers() -> None:
-    """Ausreißerbereinigung"""
-
-    if st.session_state["ni_outl"] < st.session_state["abs_max"]:
-        for fig in st.session_state["lis_figs"]:
-            if fig != "fig_mon":
-                st.session_state[fig] = remove_outl(
-                    st.session_state[fig], st.session_state["ni_outl"]
-                )
-
-
 # geglättete Linien
 # @dics.timer()
 # def smooth():
@@ -659,112 +860,150 @@ def clean_outliers() -> None:
 #     )
 
 
-@dics.timer()
-def update_vis_main() -> None:
-    """Darstellungseinstellungen"""
+def legend_groups(fig: go.Figure, visible: list) -> tuple[list, list]:
+    """Legendengruppen der Linien in fig_base (mehrere Jahre)
 
-    for fig in st.session_state["lis_figs"]:
+    Gruppierung nur, wenn mehrere Gruppen angezeigt werden und
+    mindestens eine davon mehr als eine Linie hat.
 
-        switch = fig == "fig_days"
+    Returns:
+        - legendgroup je Linie
+        - legendgrouptitle.text je Linie
+    """
+    if "lgr" not in st.session_state:
+        st.session_state["lgr"] = {
+            tr.name: tr.legendgroup for tr in fig.data if tr.legendgroup is not None
+        }
 
-        # anzuzeigende Achsen
-        axes_vis = [
-            dat.yaxis
-            for dat in st.session_state[fig].data
-            if st.session_state.get(f"cb_vis_{dat.legendgroup if switch else dat.name}")
-        ]
-        axes_layout = [x for x in st.session_state[fig].layout if "yaxis" in x]
+    if "lgr_t" not in st.session_state:
+        st.session_state["lgr_t"] = {
+            tr.name: tr.legendgrouptitle.text
+            for tr in fig.data
+            if tr.legendgroup is not None
+        }
 
-        for a_x in axes_layout:
-            st.session_state[fig].update_layout(
-                {a_x: {"visible": a_x.replace("axis", "") in axes_vis}}
-            )
+    lgr, lgr_t = st.session_state["lgr"], st.session_state["lgr_t"]
+    groups = Counter(
+        lgr[tr.name] for tr, vis in zip(fig.data, visible) if vis and tr.name in lgr
+    )
+    if len(groups) < 2 or max(groups.values()) < 2:
+        return [None] * len(fig.data), [None] * len(fig.data)
 
-        # anzuzeigende Traces
-        for trace in st.session_state[fig].data:
-            if not switch:
-                trace.line.color = st.session_state.get("cp_" + trace.name)
-            trace.visible = st.session_state[
-                f"cb_vis_{trace.legendgroup if switch else trace.name}"
-            ]
-            trace.fill = (
-                "tozeroy"
-                if st.session_state[
-                    f"cb_fill_{trace.legendgroup if switch else trace.name}"
-                ]
-                else None
-            )
+    return (
+        [
+            lgr.get(tr.name) if tr.legendgroup is None else tr.legendgroup
+            for tr in fig.data
+        ],
+        [
+            lgr_t.get(tr.name) if tr.legendgroup is None else tr.legendgrouptitle.text
+            for tr in fig.data
+        ],
+    )
 
-        for annot in st.session_state[fig].layout.annotations:
-            if "hline" not in annot.name:
-                annot.visible = bool(st.session_state.get("cb_anno_" + annot.name))
-
-        # Legende ausblenden, wenn nur eine Linie angezeigt wird
-        st.session_state[fig].update_layout(
-            showlegend=len(
-                [
-                    tr
-                    for tr in st.session_state[fig].data
-                    if tr.visible is True
-                    and all(n not in gv.exclude for n in tr.name.split())
-                ]
-            )
-            != 1
+
+@dics.timer()
+def vis_delta(fig: str) -> tuple[dict, dict]:
+    """Abweichungen der Grafik von den Darstellungseinstellungen
+
+    Soll-Zustand aus den Anzeigeoptionen (cb_vis_..., cb_fill_..., cp_..., cb_anno_...),
+    Linien ohne Menu-Eintrag bleiben, wie sie sind.
+
+    Returns:
+        - restyle: {Eigenschaft: {Index der Linie: Wert}}
+        - relayout: {Eigenschaft: Wert} (z.B. "yaxis2.visible", "annotations[3].visible")
+    """
+    figure = st.session_state[fig]
+    switch = fig == "fig_days"
+
+    # Soll-Zustand der Linien
+    target = {"visible": [], "fill": [], "line.color": []}
+    axes_vis = set()
+    for trace in figure.data:
+        name = trace.legendgroup if switch else trace.name
+        fill = trace.fill
+        if f"cb_fill_{name}" in st.session_state:
+            fill = "tozeroy" if st.session_state[f"cb_fill_{name}"] else None
+
+        target["visible"].append(st.session_state.get(f"cb_vis_{name}", trace.visible))
+        target["fill"].append(fill)
+        target["line.color"].append(
+            trace.line.color
+            if switch
+            else st.session_state.get(f"cp_{name}", trace.line.color)
         )
+        if st.session_state.get(f"cb_vis_{name}"):
+            axes_vis.add(trace.yaxis)
 
     # Gruppierung der Legende ausschalten, wenn nur eine Linie in Gruppe
-    if st.session_state.get("cb_multi_year"):
-        if "lgr" not in st.session_state:
-            st.session_state["lgr"] = {
-                tr.name: tr.legendgroup
-                for tr in st.session_state["fig_base"].data
-                if tr.legendgroup is not None
-            }
+    if fig == "fig_base" and st.session_state.get("cb_multi_year"):
+        target["legendgroup"], target["legendgrouptitle.text"] = legend_groups(
+            figure, target["visible"]
+        )
 
-        if "lgr_t" not in st.session_state:
-            st.session_state["lgr_t"] = {
-                tr.name: tr.legendgrouptitle
-                for tr in st.session_state["fig_base"].data
-                if tr.legendgrouptitle is not None
-            }
+    current = {
+        "visible": [tr.visible for tr in figure.data],
+        "fill": [tr.fill for tr in figure.data],
+        "line.color": [tr.line.color for tr in figure.data],
+        "legendgroup": [tr.legendgroup for tr in figure.data],
+        "legendgrouptitle.text": [tr.legendgrouptitle.text for tr in figure.data],
+    }
+    restyle = {
+        prop: {
+            idx: val
+            for idx, (val, val_cur) in enumerate(zip(values, current[prop]))
+            if val != val_cur
+        }
+        for prop, values in target.items()
+    }
+
+    # Achsen, Anmerkungen und Legende
+    relayout = {}
+    for a_x in [x for x in figure.layout if "yaxis" in x]:
+        vis = a_x.replace("axis", "") in axes_vis
+        if figure.layout[a_x].visible != vis:
+            relayout[f"{a_x}.visible"] = vis
+
+    for pos, annot in enumerate(figure.layout.annotations):
+        if "hline" in annot.name:
+            continue
+        vis = bool(st.session_state.get("cb_anno_" + annot.name))
+        if annot.visible != vis:
+            relayout[f"annotations[{pos}].visible"] = vis
+
+    # Legende ausblenden, wenn nur eine Linie angezeigt wird
+    showlegend = (
+        sum(
+            vis is True and all(n not in gv.exclude for n in tr.name.split())
+            for tr, vis in zip(figure.data, target["visible"])
+        )
+        != 1
+    )
+    if figure.layout.showlegend != showlegend:
+        relayout["showlegend"] = showlegend
+
+    return {prop: dic for prop, dic in restyle.items() if dic}, relayout
+
+
+@dics.timer()
+def apply_vis_delta(fig: go.Figure, restyle: dict, relayout: dict) -> None:
+    """Abweichungen übernehmen (je Eigenschaft ein restyle, ein relayout)"""
+    for prop, dic_val in restyle.items():
+        fig.plotly_restyle({prop: list(dic_val.values())}, trace_indexes=list(dic_val))
+
+    if relayout:
+        fig.plotly_relayout(relayout)
 
-        b_gr = False
-        if (
-            len(
-                {
-                    tr.legendgroup
-                    for tr in st.session_state["fig_base"].data
-                    if tr.visible
-                }
-            )
-            > 1
-        ):
-            for leg_gr in set(st.session_state["lgr"].values()):
-                if (
-                    len(
-                        [
-                            trace
-                            for trace in st.session_state["fig_base"].data
-                            if (
-                                st.session_state["lgr"].get(trace.name) == leg_gr
-                                and trace.visible
-                            )
-                        ]
-                    )
-                    > 1
-                ):
-                    b_gr = True
-
-        if b_gr:
-            for trace in st.session_state["fig_base"].data:
-                if trace.legendgroup is None:
-                    trace.legendgroup = st.session_state["lgr"].get(trace.name)
-                    trace.legendgrouptitle = st.session_state["lgr_t"].get(trace.name)
-        else:
-            st.session_state["fig_base"].update_traces(
-                legendgroup=None,
-                legendgrouptitle=None,
-            )
+
+@dics.timer()
+def update_vis_main() -> None:
+    """Darstellungseinstellungen
+
+    Geändert werden nur Eigenschaften, die von den Anzeigeoptionen abweichen
+    (siehe vis_delta).
+    """
+
+    for fig in st.session_state["lis_figs"]:
+        apply_vis_delta(st.session_state[fig], *vis_delta(fig))
 
 
 @dics.timer()
@@ -847,7 +1086,7 @@ def html_exp(f_pn: str = "export/interaktive_grafische_Auswertung.html") -> None
 
         fil.write("</style>")
 
-        for fig in st.session_state["lis_figs"]:
+        for count, fig in enumerate(st.session_state["lis_figs"]):
             if "Lastgang" in st.session_state[fig].layout.meta.get("title"):
                 fil.write('<div id="las">')
             elif "Jahresdauerlinie" in st.session_state[fig].layout.meta.get("title"):
@@ -855,8 +1094,13 @@ def html_exp(f_pn: str = "export/interaktive_grafische_Auswertung.html") -> None
             elif "Monatswerte" in st.session_state[fig].layout.meta.get("title"):
                 fil.write('<div id="mon">')
 
+            # plotly.js nur mit der ersten Grafik
             fil.write(
-                st.session_state[fig].to_html(full_html=False, config=plotly_config())
+                payload.to_html(
+                    st.session_state[fig],
+                    config=plotly_config(),
+                    include_plotlyjs=count == 0,
+                )
             )
 
             fil.write("<br /><br /><hr><br /><br /><br /></div>")
@@ -8,17 +8,30 @@ import pandas as pd
 import streamlit as st
 
 from modules import def_dics as dics
+from modules import df_manip as dfm
+from modules import fig_payload as payload
 from modules import fig_update_anno as fuan
 from modules import plotly_plots as ploplo
+from modules import session_store as sst
 
 TIT_H = '<i><span style="font-size: 12px;"> (Stundenwerte)</span></i>'
 TIT_15 = '<i><span style="font-size: 12px;"> (15-Minuten-Werte)</span></i>'
 
+
 # Grund-Grafik
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def cr_fig_base() -> None:
-    """Lastgang erstellen"""
+    """Lastgang erstellen
+
+    Die Linien in fig_base sind nur für die Darstellung da: gewählter Zeitraum
+    aus der passenden Auflösungsstufe (dfm.pyramid_level), je Linie auf
+    höchstens ni_points Punkte ausgedünnt (ploplo.minmax_indices).
+    Aus den Linien lesen dürfen nur Funktionen, die zeichnen oder die Achsen
+    einstellen (fuan.update, fuan.range_slider, fuan.hline_fill, Farben,
+    Anzeigeoptionen). Werte für alles andere (Excel-Export, Pfeile an
+    Maxima, Glättung) kommen in voller Auflösung aus fuan.fig_source.
+    """
 
     if st.session_state.get("cb_h"):
         tit_res = TIT_H
@@ -27,10 +40,11 @@ def cr_fig_base() -> None:
 
     if st.session_state.get("cb_multi_year"):
         st.session_state["fig_base"] = ploplo.line_plot_y_overlay(
-            st.session_state["dic_df_multi"],
+            sst.get("dic_df_multi"),
             st.session_state["dic_meta"],
             st.session_state["lis_years"],
             title=f"Lastgang{tit_res}",
+            n_points=st.session_state.get("ni_points", ploplo.MAX_POINTS),
         )
     else:
         if (
@@ -47,20 +61,42 @@ def cr_fig_base() -> None:
         #     else f"Lastgang{tit_res}"
         # )
 
+        df = sst.get("df_h") if st.session_state.get("cb_h") else st.session_state["df"]
+
+        # gewählter Zeitraum aus der passenden Auflösungsstufe
+        if isinstance(df.index, pd.DatetimeIndex):
+            df = dfm.pyramid_level(
+                df,
+                dfm.df_pyramid(
+                    df,
+                    "dic_pyramid_h" if st.session_state.get("cb_h") else "dic_pyramid",
+                ),
+                *fuan.fig_range(df),
+                st.session_state.get("ni_points", ploplo.MAX_POINTS),
+            )
+
         st.session_state["fig_base"] = ploplo.line_plot(
-            st.session_state["df_h"]
-            if st.session_state.get("cb_h")
-            else st.session_state["df"],
+            df,
             st.session_state["dic_meta"],
             title=tit,
+            n_points=st.session_state.get("ni_points", ploplo.MAX_POINTS),
         )
 
+    # Kennwerte der neuen Linien (siehe fig_update_anno.fig_stats)
+    fuan.reset_stats("fig_base")
+
     # Pfeile an Maxima
     fuan.arrows_min_max("fig_base")
 
-    # geglättete Linien
+    # geglättete Linien (Fenster in Punkten der Daten im dargestellten Zeitraum,
+    # siehe fuan.smooth)
     max_val = int(
-        max(len(t.x) for t in st.session_state["fig_base"].data if len(t.x) > 20) // 3
+        max(
+            sta["len_data"]
+            for sta in fuan.fig_stats(st.session_state["fig_base"])
+            if sta["len_data"] > 20
+        )
+        // 3
     )
 
     max_val = st.session_state["smooth_max_val"] = int(
@@ -70,7 +106,7 @@ def cr_fig_base() -> None:
     st.session_state["smooth_start_val"] = int(
         start_val + 1 if start_val % 2 == 0 else start_val
     )
-    if "gl_win" not in st.session_state:
+    if st.session_state.get("gl_win", max_val + 1) > max_val:
         st.session_state["gl_win"] = st.session_state["smooth_start_val"]
     if "gl_deg" not in st.session_state:
         st.session_state["gl_deg"] = 3
@@ -105,10 +141,11 @@ def cr_fig_jdl() -> None:
 
     if st.session_state.get("cb_multi_year"):
         st.session_state["fig_jdl"] = ploplo.line_plot_y_overlay(
-            st.session_state["dic_jdl"],
+            sst.get("dic_jdl"),
             st.session_state["dic_meta"],
             st.session_state["lis_years"],
             title=f"geordnete Jahresdauerlinie{TIT_H}",
+            n_points=st.session_state.get("ni_points", ploplo.MAX_POINTS),
         )
     else:
         if (
@@ -133,9 +170,15 @@ def cr_fig_jdl() -> None:
         # )
 
         st.session_state["fig_jdl"] = ploplo.line_plot(
-            st.session_state["df_jdl"], st.session_state["dic_meta"], title=tit
+            sst.get("df_jdl"),
+            st.session_state["dic_meta"],
+            title=tit,
+            n_points=st.session_state.get("ni_points", ploplo.MAX_POINTS),
         )
 
+    # Kennwerte der neuen Linien (siehe fig_update_anno.fig_stats)
+    fuan.reset_stats("fig_jdl")
+
     # Pfeile an Maxima
     fuan.arrows_min_max("fig_jdl")
 
@@ -155,8 +198,7 @@ def cr_fig_jdl() -> None:
         legendgroup=None,
         legendgrouptitle=None,
     )
-    x_min = min(min(d.x) for d in st.session_state["fig_jdl"].data)
-    x_max = max(max(d.x) for d in st.session_state["fig_jdl"].data)
+    x_min, x_max = fuan.fig_extent(st.session_state["fig_jdl"])
 
     if 7000 < x_max < 9000:
         st.session_state["fig_jdl"].update_xaxes(
@@ -171,7 +213,7 @@ def cr_fig_mon() -> None:
 
     if st.session_state.get("cb_multi_year"):
         st.session_state["fig_mon"] = ploplo.line_plot_y_overlay(
-            st.session_state["dic_mon"],
+            sst.get("dic_mon"),
             st.session_state["dic_meta"],
             st.session_state["lis_years"],
             title="Monatswerte",
@@ -193,9 +235,12 @@ def cr_fig_mon() -> None:
         # )
 
         st.session_state["fig_mon"] = ploplo.line_plot(
-            st.session_state["df_mon"], st.session_state["dic_meta"], title=tit
+            sst.get("df_mon"), st.session_state["dic_meta"], title=tit
         )
 
+    # Kennwerte der neuen Linien (siehe fig_update_anno.fig_stats)
+    fuan.reset_stats("fig_mon")
+
     # Pfeile an Maxima
     fuan.arrows_min_max("fig_mon")
 
@@ -203,12 +248,8 @@ def cr_fig_mon() -> None:
         x_min = datetime.datetime(2020, 1, 1)
         x_max = datetime.datetime(2020, 12, 31)
     else:
-        x_min = min(tr.x.min() for tr in st.session_state["fig_mon"].data).replace(
-            day=1
-        )
-        x_max = max(tr.x.max() for tr in st.session_state["fig_mon"].data).replace(
-            day=31
-        )
+        x_min, x_max = fuan.fig_extent(st.session_state["fig_mon"])
+        x_min, x_max = x_min.replace(day=1), x_max.replace(day=31)
 
     st.session_state["fig_mon"] = fuan.update(st.session_state["fig_mon"], x_max, x_min)
 
@@ -242,9 +283,16 @@ def cr_fig_days() -> None:
         tit += TIT_15
 
     st.session_state["fig_days"] = ploplo.line_plot_day_overlay(
-        st.session_state["dic_days"], st.session_state["dic_meta"], tit, "fig_days"
+        sst.get("dic_days"),
+        st.session_state["dic_meta"],
+        tit,
+        "fig_days",
+        n_points=st.session_state.get("ni_points", ploplo.MAX_POINTS),
     )
 
+    # Kennwerte der neuen Linien (siehe fig_update_anno.fig_stats)
+    fuan.reset_stats("fig_days")
+
     # Pfeile an Maxima
     # fuan.arrows_min_max("fig_days")
 
@@ -272,7 +320,7 @@ def plot_figs() -> None:
     with st.container():
 
         st.plotly_chart(
-            st.session_state["fig_base"],
+            payload.encode(st.session_state["fig_base"]),
             use_container_width=True,
             config=fuan.plotly_config(450),
         )
@@ -283,21 +331,21 @@ def plot_figs() -> None:
             fig_col1, fig_col2 = st.columns(2)
             with fig_col1:
                 st.plotly_chart(
-                    st.session_state["fig_jdl"],
+                    payload.encode(st.session_state["fig_jdl"]),
                     use_container_width=True,
                     config=fuan.plotly_config(),
                 )
                 if st.session_state.get("cb_days"):
                     st.markdown("###")
                     st.plotly_chart(
-                        st.session_state["fig_days"],
+                        payload.encode(st.session_state["fig_days"]),
                         use_container_width=True,
                         config=fuan.plotly_config(),
                     )
 
             with fig_col2:
                 st.plotly_chart(
-                    st.session_state["fig_mon"],
+                    payload.encode(st.session_state["fig_mon"]),
                     use_container_width=True,
                     config=fuan.plotly_config(),
                 )
@@ -306,14 +354,14 @@ def plot_figs() -> None:
             st.markdown("###")
 
             st.plotly_chart(
-                st.session_state["fig_jdl"],
+                payload.encode(st.session_state["fig_jdl"]),
                 use_container_width=True,
                 config=fuan.plotly_config(),
             )
             if st.session_state.get("cb_days"):
                 st.markdown("###")
                 st.plotly_chart(
-                    st.session_state["fig_days"],
+                    payload.encode(st.session_state["fig_days"]),
                     use_container_width=True,
                     config=fuan.plotly_config(),
                 )
@@ -322,14 +370,14 @@ def plot_figs() -> None:
             st.markdown("###")
 
             st.plotly_chart(
-                st.session_state["fig_mon"],
+                payload.encode(st.session_state["fig_mon"]),
                 use_container_width=True,
                 config=fuan.plotly_config(),
             )
             if st.session_state.get("cb_days"):
                 st.markdown("###")
                 st.plotly_chart(
-                    st.session_state["fig_days"],
+                    payload.encode(st.session_state["fig_days"]),
                     use_container_width=True,
                     config=fuan.plotly_config(),
                 )
@@ -0,0 +1,223 @@
+"""
+Zwischenspeicher für importierte Excel-Dateien
+(gemeinsam für alle Sitzungen, auf der Festplatte als Parquet + JSON)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any
+
+import pandas as pd
+
+from modules import def_dics as dics
+
+CACHE_DIR: str = os.getenv("IMPORT_CACHE_DIR", ".cache/import")
+
+# maximale Größe des Zwischenspeichers - danach werden die am längsten
+# nicht mehr benutzten Einträge gelöscht (LRU)
+CACHE_MAX_BYTES: int = int(os.getenv("IMPORT_CACHE_MAX_MB", "500")) * 1024**2
+
+# erhöhen, wenn sich das Einlesen ändert (alte Einträge werden dann ignoriert)
+CACHE_VERSION: str = "3"
+
+FILE_DF = "df.parquet"
+FILE_DELETED = "deleted.parquet"
+FILE_META = "meta.json"
+
+# abgeleitete dfs, die mit einem Eintrag gespeichert werden
+PRODUCTS = ("df_h", "df_mon", "df_jdl")
+
+
+@dics.timer()
+def file_hash(file: Any) -> str:
+    """Hash über den Inhalt der hochgeladenen Datei"""
+
+    if hasattr(file, "getvalue"):
+        content = file.getvalue()
+    else:
+        with open(file, "rb") as fil:
+            content = fil.read()
+
+    return hashlib.sha256(CACHE_VERSION.encode() + content).hexdigest()
+
+
+def sheet_digest(xml: memoryview | bytes) -> str:
+    """Hash über das XML eines Arbeitsblatts bis zum Ende der bisherigen Zeilen
+    (für den Vergleich mit angehängten Dateien)"""
+    hasher = hashlib.sha256(CACHE_VERSION.encode())
+    hasher.update(xml)
+
+    return hasher.hexdigest()
+
+
+def _json_default(obj: Any) -> Any:
+    """nicht-JSON-Typen in dic_meta kodieren"""
+    if isinstance(obj, pd.Timedelta):
+        return {"__timedelta__": obj.value}
+    if isinstance(obj, pd.Timestamp):
+        return {"__timestamp__": obj.isoformat()}
+    raise TypeError(f"{type(obj)} kann nicht gespeichert werden")
+
+
+def _json_object_hook(dic: dict) -> Any:
+    """kodierte Typen in dic_meta wiederherstellen"""
+    if "__timedelta__" in dic:
+        return pd.Timedelta(dic["__timedelta__"])
+    if "__timestamp__" in dic:
+        return pd.Timestamp(dic["__timestamp__"])
+    return dic
+
+
+def _dir_size(path: str) -> int:
+    """Größe eines Eintrags in Bytes"""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+@dics.timer()
+def load(key: str) -> tuple | None:
+    """Eintrag aus dem Zwischenspeicher laden (None, wenn nicht vorhanden)"""
+
+    path = os.path.join(CACHE_DIR, key)
+    if not os.path.isfile(os.path.join(path, FILE_META)):
+        return None
+
+    try:
+        df = pd.read_parquet(os.path.join(path, FILE_DF))
+        df_deleted = pd.read_parquet(os.path.join(path, FILE_DELETED))
+        with open(os.path.join(path, FILE_META), encoding="utf-8") as fil:
+            dic_meta = json.load(fil, object_hook=_json_object_hook)
+    except (OSError, ValueError):
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    # Zugriffszeit für LRU aktualisieren
+    os.utime(path)
+
+    return df, dic_meta, df_deleted
+
+
+@dics.timer()
+def save(key: str, df: pd.DataFrame, dic_meta: dict, df_deleted: pd.DataFrame) -> None:
+    """Eintrag in den Zwischenspeicher schreiben"""
+
+    path = os.path.join(CACHE_DIR, key)
+    if os.path.isdir(path):
+        return
+
+    # erst in temporären Ordner schreiben, dann umbenennen,
+    # damit andere Sitzungen nie einen halben Eintrag lesen
+    path_tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(path_tmp, exist_ok=True)
+    try:
+        df.drop(columns="orgidx", errors="ignore").to_parquet(
+            os.path.join(path_tmp, FILE_DF)
+        )
+        df_deleted.to_parquet(os.path.join(path_tmp, FILE_DELETED))
+        with open(os.path.join(path_tmp, FILE_META), "w", encoding="utf-8") as fil:
+            json.dump(dic_meta, fil, default=_json_default)
+        os.replace(path_tmp, path)
+    except (OSError, ValueError, TypeError):
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        return
+
+    evict()
+
+
+@dics.timer()
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """am längsten nicht benutzte Einträge löschen, bis die Maximalgröße passt"""
+
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    entries = [
+        entry
+        for entry in os.scandir(CACHE_DIR)
+        if entry.is_dir() and not entry.name.endswith(".tmp")
+    ]
+    sizes = {entry.path: _dir_size(entry.path) for entry in entries}
+    total = sum(sizes.values())
+
+    for entry in sorted(entries, key=lambda ent: ent.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry.path, ignore_errors=True)
+        total -= sizes[entry.path]
+
+
+@dics.timer()
+def find_prefix(cols: list, first: str) -> tuple | None:
+    """Eintrag, dessen Daten der Anfang einer neuen Datei sein könnten
+
+    Gesucht wird über gleiche Spalten und gleichen ersten Zeitstempel
+    ("source" in dic_meta["index"]), bei mehreren Treffern der längste.
+
+    Returns:
+        - key des Eintrags
+        - Angaben zur Quelle (Zeilen, Hash, Spalten, Spaltentitel, ...)
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return None
+
+    found = None
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.is_dir() or entry.name.endswith(".tmp"):
+            continue
+        try:
+            with open(os.path.join(entry.path, FILE_META), encoding="utf-8") as fil:
+                source = json.load(fil)["index"].get("source")
+        except (OSError, ValueError, KeyError):
+            continue
+        if (
+            source
+            and source["cols"] == cols
+            and source["first"] == first
+            and (found is None or source["rows"] > found[1]["rows"])
+        ):
+            found = entry.name, source
+
+    return found
+
+
+@dics.timer()
+def save_products(key: str, dic_products: dict) -> None:
+    """abgeleitete dfs zu einem Eintrag speichern (vorhandene bleiben)"""
+
+    path = os.path.join(CACHE_DIR, key)
+    if not os.path.isdir(path):
+        return
+
+    written = False
+    for name, df in dic_products.items():
+        file = os.path.join(path, f"{name}.parquet")
+        if os.path.isfile(file):
+            continue
+        file_tmp = f"{file}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(file_tmp)
+            os.replace(file_tmp, file)
+            written = True
+        except (OSError, ValueError, TypeError):
+            if os.path.isfile(file_tmp):
+                os.remove(file_tmp)
+
+    if written:
+        evict()
+
+
+@dics.timer()
+def load_products(key: str) -> dict:
+    """gespeicherte abgeleitete dfs eines Eintrags"""
+
+    dic_products = {}
+    for name in PRODUCTS:
+        file = os.path.join(CACHE_DIR, key, f"{name}.parquet")
+        if os.path.isfile(file):
+            try:
+                dic_products[name] = pd.read_parquet(file)
+            except (OSError, ValueError):
+                continue
+
+    return dic_products
@@ -19,6 +19,7 @@ from wetterdienst.provider.dwd.observation import DwdObservationRequest as dwd
 
 from modules import def_dics as dics
 from modules import global_variables as gv
+from modules import session_store as sst
 
 load_dotenv(".streamlit/secrets.toml")
 
@@ -701,6 +702,24 @@ def del_meteo() -> None:
                     if meteo in col:
                         st.session_state[key].drop(columns=[str(col)], inplace=True)
 
+    # Spalten in den abgeleiteten dfs löschen
+    lis_meteo = [str(DIC_METEOSTAT_CODES[code]["tit"]) for code in DIC_METEOSTAT_CODES]
+    for name in sst.names():
+        data = sst.get(name)
+        dic_df = data if isinstance(data, dict) else {None: data}
+        cols_meteo = {
+            str(col)
+            for df in dic_df.values()
+            for col in df.columns
+            if any(meteo in str(col) for meteo in lis_meteo)
+        }
+        if cols_meteo:
+            dic_df = {
+                key: df.drop(columns=[col for col in df.columns if col in cols_meteo])
+                for key, df in dic_df.items()
+            }
+            sst.put(name, dic_df if isinstance(data, dict) else dic_df[None])
+
     # Metadaten löschen
     if st.session_state.get("dic_meta"):
         if "Temperatur" in st.session_state["dic_meta"].keys():
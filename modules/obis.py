@@ -0,0 +1,47 @@
+"""
+OBIS-Kennzahlen (z.B. "1-1:1.29.0") erkennen und zerlegen
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Medium-Kanal:Messgröße.Messart(.Tarifstufe ...)
+OBIS_REGEX = re.compile(
+    r"(?P<medium>\d+)-(?P<kanal>\d+):(?P<messgr>\d+)\.(?P<messart>\d+)"
+)
+
+# Medium Elektrizität
+MEDIUM_EL: str = "1"
+
+
+@dataclass(frozen=True)
+class ObisCode:
+    """zerlegte OBIS-Kennzahl"""
+
+    code: str
+    medium: str
+    kanal: str
+    messgr: str
+    messart: str
+
+
+@lru_cache(maxsize=4096)
+def parse(text: str) -> ObisCode | None:
+    """OBIS-Kennzahl in einem Text (z.B. Spaltentitel) finden und zerlegen
+
+    Die Kennzahl reicht bis zum Ende des Textes (Klammern werden entfernt),
+    z.B. "Lieferung (1-1:2.5.3)" -> "1-1:2.5.3".
+    Ohne Kennzahl: None
+    """
+    match = OBIS_REGEX.search(text)
+    if match is None:
+        return None
+
+    return ObisCode(
+        code=text[match.start() :].replace("(", "").replace(")", ""),
+        medium=match["medium"],
+        kanal=match["kanal"],
+        messgr=match["messgr"],
+        messart=match["messart"],
+    )
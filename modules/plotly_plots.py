@@ -4,6 +4,7 @@ Darstellung der Plots
 
 import os
 from collections import Counter
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -14,6 +15,123 @@ from geopy import distance
 from modules import def_dics as dics
 from modules import meteorolog as meteo
 
+# Punkte je Linie, auf die große Datenmengen ausgedünnt werden (Voreinstellung)
+MAX_POINTS: int = 5000
+
+# ab so vielen Punkten je Linie wird WebGL (Scattergl) statt SVG verwendet
+GL_POINTS: int = int(os.getenv("PLOT_GL_POINTS", "100000"))
+
+
+def scatter_type(n_points: int) -> Any:
+    """go.Scattergl für lange Linien (mehr als GL_POINTS Punkte), sonst go.Scatter
+
+    Linien, die aus einer anderen abgeleitet werden (Füllung, Glättung),
+    sollten den gleichen Typ haben wie die Ausgangslinie.
+    """
+    return go.Scattergl if n_points > GL_POINTS else go.Scatter
+
+
+def hover_format(values: Any) -> str:
+    """d3-Zahlenformat für den hover einer Linie
+
+    Nachkommastellen nach dem größten Betrag der Linie
+    (< 10: zwei, < 100: eine, sonst keine) - ein Format je Linie statt
+    eines Textes je Punkt.
+    """
+    val_abs = np.abs(np.asarray(values, dtype="float64"))
+    val_max = np.nanmax(val_abs) if np.isfinite(val_abs).any() else 0
+
+    if val_max < 10:
+        return ",.2f"
+    if val_max < 100:
+        return ",.1f"
+    return ",.0f"
+
+
+def minmax_indices(values: np.ndarray, n_points: int | None) -> np.ndarray:
+    """Indizes für das Ausdünnen einer Linie auf ca. n_points Punkte
+
+    Die Werte werden in gleich lange Abschnitte geteilt und je Abschnitt
+    Minimum und Maximum behalten - Spitzen gehen so nicht verloren.
+    Lücken (NaN) bleiben mit ihrem ersten Wert im Abschnitt erhalten.
+    """
+    len_val = len(values)
+    if not n_points or len_val <= n_points:
+        return np.arange(len_val)
+
+    size = -(-len_val // max(n_points // 2, 1))
+    n_blocks = -(-len_val // size)
+    offsets = np.arange(n_blocks) * size
+
+    blocks = np.full(n_blocks * size, np.nan)
+    blocks[:len_val] = values
+    blocks = blocks.reshape(n_blocks, size)
+    nan = np.isnan(blocks)
+    nan_real = nan & (np.arange(n_blocks * size) < len_val).reshape(n_blocks, size)
+
+    return np.unique(
+        np.concatenate(
+            [
+                [0, len_val - 1],
+                np.where(nan, np.inf, blocks).argmin(axis=1) + offsets,
+                np.where(nan, -np.inf, blocks).argmax(axis=1) + offsets,
+                (nan_real.argmax(axis=1) + offsets)[nan_real.any(axis=1)],
+            ]
+        )
+    )
+
+
+def trace_peaks(x: Any, y: Any, customdata: Any = None) -> dict:
+    """Maximum und Minimum einer Linie mit x-Wert und customdata
+
+    Returns:
+        - {"max": {"x", "y", "customdata"}, "min": {...}}
+            (None, wenn die Linie nur NaN enthält)
+    """
+    val_y = np.asarray(y, dtype="float64")
+    if np.isnan(val_y).all():
+        return {"max": None, "min": None}
+
+    def at_pos(values: Any, pos: int) -> Any:
+        """Wert an einer Position (Series über iloc)"""
+        if values is None:
+            return None
+        return values.iloc[pos] if isinstance(values, pd.Series) else values[pos]
+
+    return {
+        key: {
+            "x": at_pos(x, pos),
+            "y": float(val_y[pos]),
+            "customdata": at_pos(customdata, pos),
+        }
+        for key, pos in (
+            ("max", int(np.nanargmax(val_y))),
+            ("min", int(np.nanargmin(val_y))),
+        )
+    }
+
+
+def trace_stats(x: Any, y: Any, customdata: Any = None) -> dict:
+    """Kennwerte einer Linie (Länge, NaN, Bereich x, Maximum und Minimum)
+
+    Zwischengespeichert je Grafik und Linie in st.session_state
+    (siehe fig_update_anno.fig_stats).
+    """
+    val_y = np.asarray(y, dtype="float64")
+    stats = {
+        "len": len(val_y),
+        "n_nan": int(np.isnan(val_y).sum()),
+        "x_min": None,
+        "x_max": None,
+        **trace_peaks(x, val_y, customdata),
+    }
+    if len(x) > 0:
+        stats["x_min"], stats["x_max"] = (
+            (x.min(), x.max()) if isinstance(x, pd.Index) else (min(x), max(x))
+        )
+
+    return stats
+
 
 @dics.timer()
 def line_plot(
@@ -22,8 +140,10 @@ def line_plot(
     lines: list = None,
     title: str = "",
     var_name: str = "",
+    n_points: int | None = None,
 ) -> go.Figure:
-    """Liniengrafik"""
+    """Liniengrafik (mit n_points: Linien ausgedünnt, siehe minmax_indices;
+    lange Linien als WebGL, siehe scatter_type)"""
 
     if not lines:
         lines = list(df.columns)
@@ -39,39 +159,22 @@ def line_plot(
         lis_units.append(dic_meta[line].get("unit_graph"))
         manip = -1 if any(True for x in line.split() if x in dics.LIS_NEG) else 1
         cusd = df[f"{line}_orgidx"] if f"{line}_orgidx" in df.columns else df["orgidx"]
+        idx = minmax_indices(df[line].to_numpy(dtype="float64"), n_points)
+        y_val = df[line].iloc[idx]
 
         fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=df[line] * manip,
-                customdata=cusd,
+            scatter_type(len(idx))(
+                x=df.index[idx],
+                y=y_val * manip,
+                customdata=cusd.iloc[idx],
                 name=dic_meta[line].get("tit"),
                 hovertemplate=(
-                    np.select(
-                        [abs(df[line]) < 10, abs(df[line]) < 100],
-                        [
-                            "%{y:,.2f}"
-                            + dic_meta[line].get("unit_graph")
-                            + (
-                                " (%{customdata|%a %d. %b %Y %H:%M})"
-                                if "Monatswerte" not in title
-                                else " (%{customdata|%b %Y})"
-                            ),
-                            "%{y:,.1f}"
-                            + dic_meta[line].get("unit_graph")
-                            + (
-                                " (%{customdata|%a %d. %b %Y %H:%M})"
-                                if "Monatswerte" not in title
-                                else " (%{customdata|%b %Y})"
-                            ),
-                        ],
-                        "%{y:,.0f}"
-                        + dic_meta[line].get("unit_graph")
-                        + (
-                            " (%{customdata|%a %d. %b %Y %H:%M})"
-                            if "Monatswerte" not in title
-                            else " (%{customdata|%b %Y})"
-                        ),
+                    f"%{{y:{hover_format(y_val)}}}"
+                    + dic_meta[line].get("unit_graph")
+                    + (
+                        " (%{customdata|%a %d. %b %Y %H:%M})"
+                        if "Monatswerte" not in title
+                        else " (%{customdata|%b %Y})"
                     )
                 ),
                 mode="lines",
@@ -97,8 +200,12 @@ def line_plot_y_overlay(
     lines: list = None,
     title: str = "",
     var_name: str = "",
+    n_points: int | None = None,
 ) -> go.Figure:
-    """Liniengrafik mit mehreren Jahren übereinander (Jahreszahlen werden ausgetauscht)"""
+    """Liniengrafik mit mehreren Jahren übereinander (Jahreszahlen werden ausgetauscht)
+
+    mit n_points: Linien ausgedünnt, siehe minmax_indices
+    """
     fig = go.Figure()
     fig.layout.meta = {
         "title": title,
@@ -120,45 +227,25 @@ def line_plot_y_overlay(
                 if f"{line}_orgidx" in list(dic_df[year].columns)
                 else dic_df[year]["orgidx"]
             )
+            idx = minmax_indices(dic_df[year][line].to_numpy(dtype="float64"), n_points)
+            y_val = dic_df[year][line].iloc[idx]
 
             fig.add_trace(
-                go.Scatter(
-                    x=dic_df[year].index,
-                    y=dic_df[year][line] * manip,
-                    customdata=cusd,
+                scatter_type(len(idx))(
+                    x=dic_df[year].index[idx],
+                    y=y_val * manip,
+                    customdata=cusd.iloc[idx],
                     legendgroup=year,
                     legendgrouptitle_text=year,
                     name=dic_meta[line].get("tit") + " " + str(year),
                     mode="lines",
                     hovertemplate=(
-                        np.select(
-                            [
-                                abs(dic_df[year][line]) < 10,
-                                abs(dic_df[year][line]) < 100,
-                            ],
-                            [
-                                "%{y:,.2f}"
-                                + dic_meta[line].get("unit_graph")
-                                + (
-                                    " (%{customdata|%a %d. %b %Y %H:%M})"
-                                    if "Monatswerte" not in title
-                                    else " (%{customdata|%b %Y})"
-                                ),
-                                "%{y:,.1f}"
-                                + dic_meta[line].get("unit_graph")
-                                + (
-                                    " (%{customdata|%a %d. %b %Y %H:%M})"
-                                    if "Monatswerte" not in title
-                                    else " (%{customdata|%b %Y})"
-                                ),
-                            ],
-                            "%{y:,.0f}"
-                            + dic_meta[line].get("unit_graph")
-                            + (
-                                " (%{customdata|%a %d. %b %Y %H:%M})"
-                                if "Monatswerte" not in title
-                                else " (%{customdata|%b %Y})"
-                            ),
+                        f"%{{y:{hover_format(y_val)}}}"
+                        + dic_meta[line].get("unit_graph")
+                        + (
+                            " (%{customdata|%a %d. %b %Y %H:%M})"
+                            if "Monatswerte" not in title
+                            else " (%{customdata|%b %Y})"
                         )
                     ),
                     visible=True,
@@ -176,9 +263,13 @@ def line_plot_y_overlay(
 # @st.experimental_memo(suppress_st_warning=True, show_spinner=False)
 @dics.timer()
 def line_plot_day_overlay(
-    dic_days: dict, dic_meta: dict, title: str = "", var_name: str = ""
+    dic_days: dict,
+    dic_meta: dict,
+    title: str = "",
+    var_name: str = "",
+    n_points: int | None = None,
 ) -> go.Figure:
-    """Liniengrafik für Tagesvergleich"""
+    """Liniengrafik für Tagesvergleich (mit n_points: Linien ausgedünnt)"""
 
     fig = go.Figure()
     fig.layout.meta = {
@@ -196,38 +287,24 @@ def line_plot_day_overlay(
                 if f"{line}_orgidx" in dic_days[date].columns
                 else dic_days[date]["orgidx"]
             )
+            idx = minmax_indices(
+                dic_days[date][line].to_numpy(dtype="float64"), n_points
+            )
+            y_val = dic_days[date][line].iloc[idx]
 
             fig.add_trace(
-                go.Scatter(
-                    x=dic_days[date].index,
-                    y=dic_days[date][line] * manip,
-                    customdata=cusd,
+                scatter_type(len(idx))(
+                    x=dic_days[date].index[idx],
+                    y=y_val * manip,
+                    customdata=cusd.iloc[idx],
                     name=date,
                     mode="lines",
                     hovertemplate=(
-                        np.select(
-                            [
-                                abs(dic_days[date][line]) < 10,
-                                abs(dic_days[date][line]) < 100,
-                            ],
-                            [
-                                "%{y:,.2f}"
-                                + dic_meta[line].get("unit_graph")
-                                + " (%{customdata|%a %e. %b %Y %H:%M})<extra>"
-                                + line
-                                + "</extra>",
-                                "%{y:,.1f}"
-                                + dic_meta[line].get("unit_graph")
-                                + " (%{customdata|%a %e. %b %Y %H:%M})<extra>"
-                                + line
-                                + "</extra>",
-                            ],
-                            "%{y:,.0f}"
-                            + dic_meta[line].get("unit_graph")
-                            + " (%{customdata|%a %e. %b %Y %H:%M})<extra>"
-                            + line
-                            + "</extra>",
-                        )
+                        f"%{{y:{hover_format(y_val)}}}"
+                        + dic_meta[line].get("unit_graph")
+                        + " (%{customdata|%a %e. %b %Y %H:%M})<extra>"
+                        + line
+                        + "</extra>"
                     ),
                     legendgroup=line,
                     legendgrouptitle_text=line,
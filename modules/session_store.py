@@ -0,0 +1,255 @@
+"""
+Speicher für abgeleitete Daten der Sitzungen
+(Stundenwerte, Jahresdauerlinien, Monatswerte, Tagesvergleich, ...)
+
+Die dfs werden als Arrow-Tabellen gehalten und beim Lesen möglichst ohne
+Kopie (zero-copy, nur lesbar) in DataFrames umgewandelt - einmal je Tabelle,
+solange sie im Speicher ist (danach aus _FRAMES).
+Überschreiten alle Sitzungen zusammen das Speicherbudget, werden die am
+längsten nicht benutzten Tabellen als Arrow-Datei auf die Festplatte
+ausgelagert und von dort per memory-map gelesen (LRU).
+Alles wird je Sitzung gespeichert und gelöscht, sobald die Sitzung
+geschlossen wird.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from modules import def_dics as dics
+
+STORE_DIR: str = os.getenv("SESSION_STORE_DIR", ".cache/session")
+
+# Speicherbudget für alle Sitzungen zusammen (im Prozess)
+STORE_MAX_BYTES: int = int(os.getenv("SESSION_STORE_MAX_MB", "1000")) * 1024**2
+
+# ausgelagerte Dateien von Sitzungen, die so lange nicht benutzt wurden, löschen
+STORE_MAX_AGE: int = 24 * 60 * 60
+
+_LOCK = threading.RLock()
+
+# (Sitzung, Name) -> Arrow-Tabelle im Speicher (Reihenfolge = LRU)
+_TABLES: OrderedDict = OrderedDict()
+
+# (Sitzung, Name) -> None (ein df) oder Liste der keys (dictionary mit dfs)
+_ENTRIES: dict = {}
+
+# (Sitzung, Name einer Tabelle) -> Spaltentitel (beliebige Typen, z.B. Jahre)
+_COLUMNS: dict = {}
+
+# (Sitzung, Name einer Tabelle) -> umgewandeltes DataFrame (nur für Tabellen im
+# Speicher; teilt sich den Speicher mit der Tabelle, außer Spalten mit Lücken)
+_FRAMES: dict = {}
+
+# geschlossene Sitzungen, deren Tabellen noch gelöscht werden müssen
+_CLOSED: list = []
+
+
+class _SessionKey:
+    """Kennung einer Sitzung in st.session_state
+
+    Wird die Sitzung geschlossen (st.session_state wird freigegeben),
+    merkt sich weakref.finalize die Kennung zum Löschen vor.
+    """
+
+    def __init__(self) -> None:
+        self.id = uuid.uuid4().hex
+        weakref.finalize(self, _CLOSED.append, self.id)
+
+
+def _session() -> str:
+    """Kennung der Sitzung (wird beim ersten Aufruf angelegt)"""
+    _drop_closed()
+    if not isinstance(st.session_state.get("store_id"), _SessionKey):
+        st.session_state["store_id"] = _SessionKey()
+        cleanup()
+
+    return st.session_state["store_id"].id
+
+
+def _drop_closed() -> None:
+    """Tabellen und ausgelagerte Dateien geschlossener Sitzungen löschen"""
+    while _CLOSED:
+        session = _CLOSED.pop()
+        with _LOCK:
+            for key in [key for key in _ENTRIES if key[0] == session]:
+                del _ENTRIES[key]
+            for key in [key for key in _TABLES if key[0] == session]:
+                del _TABLES[key]
+            for key in [key for key in _COLUMNS if key[0] == session]:
+                del _COLUMNS[key]
+            for key in [key for key in _FRAMES if key[0] == session]:
+                del _FRAMES[key]
+        shutil.rmtree(os.path.join(STORE_DIR, session), ignore_errors=True)
+
+
+def _path(session: str, name: str) -> str:
+    """Datei für eine ausgelagerte Tabelle"""
+    return os.path.join(STORE_DIR, session, f"{name}.arrow")
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    """DataFrame als Arrow-Tabelle
+
+    Die Spalten werden nach Position benannt ("0", "1", ...), die Titel
+    bleiben in _COLUMNS - so gehen auch Zahlen, Tupel oder gemischte Titel.
+    NaN / NaT werden zu null (from_pandas).
+    """
+    return pa.Table.from_pandas(
+        df.set_axis([str(pos) for pos in range(df.shape[1])], axis="columns"),
+        preserve_index=True,
+    )
+
+
+def _spill() -> None:
+    """am längsten nicht benutzte Tabellen auslagern, bis das Budget passt"""
+    total = sum(table.nbytes for table in _TABLES.values())
+    while _TABLES and total > STORE_MAX_BYTES:
+        (session, name), table = _TABLES.popitem(last=False)
+        _FRAMES.pop((session, name), None)
+        path = _path(session, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        total -= table.nbytes
+
+
+def _put_table(session: str, name: str, df: pd.DataFrame) -> None:
+    """eine Tabelle speichern (ersetzt eine vorhandene)"""
+    _drop_table(session, name)
+    _TABLES[(session, name)] = _to_table(df)
+    _COLUMNS[(session, name)] = df.columns.copy()
+
+
+def _get_table(session: str, name: str) -> pa.Table:
+    """eine Tabelle aus dem Speicher oder der ausgelagerten Datei"""
+    if (session, name) in _TABLES:
+        _TABLES.move_to_end((session, name))
+        return _TABLES[(session, name)]
+
+    os.utime(os.path.dirname(_path(session, name)))
+    return pa.ipc.open_file(pa.memory_map(_path(session, name))).read_all()
+
+
+def _drop_table(session: str, name: str) -> None:
+    """eine Tabelle löschen"""
+    _TABLES.pop((session, name), None)
+    _COLUMNS.pop((session, name), None)
+    _FRAMES.pop((session, name), None)
+    try:
+        os.remove(_path(session, name))
+    except OSError:
+        pass
+
+
+@dics.timer()
+def put(name: str, data: pd.DataFrame | dict) -> None:
+    """df oder dictionary mit dfs speichern"""
+    session = _session()
+    with _LOCK:
+        delete(name)
+        if isinstance(data, dict):
+            _ENTRIES[(session, name)] = list(data)
+            for pos, df in enumerate(data.values()):
+                _put_table(session, f"{name}.{pos}", df)
+        else:
+            _ENTRIES[(session, name)] = None
+            _put_table(session, name, data)
+        _spill()
+
+
+def _get_df(session: str, name: str, copy: bool) -> pd.DataFrame:
+    """eine Tabelle als DataFrame (mit den ursprünglichen Spaltentiteln)
+
+    Ohne copy wird jede Tabelle im Speicher nur einmal umgewandelt; zurück
+    kommt eine flache Kopie (neue Spalten gehen nicht in den Zwischenspeicher).
+    """
+    key = (session, name)
+    if not copy and key in _FRAMES:
+        _TABLES.move_to_end(key)
+        return _FRAMES[key].copy(deep=False)
+
+    df = _get_table(session, name).to_pandas(split_blocks=not copy)
+    df.columns = _COLUMNS[key]
+    if copy or key not in _TABLES:
+        return df
+
+    _FRAMES[key] = df
+    return df.copy(deep=False)
+
+
+@dics.timer()
+def get(name: str, copy: bool = False) -> Any:
+    """gespeichertes df oder dictionary mit dfs (None, wenn nicht vorhanden)
+
+    Ohne copy teilen sich die DataFrames den Speicher mit den Arrow-Tabellen
+    (soweit möglich) und sind dann nur lesbar - wer Werte im df ändert,
+    braucht copy=True.
+    """
+    session = _session()
+    with _LOCK:
+        if (session, name) not in _ENTRIES:
+            return None
+        keys = _ENTRIES[(session, name)]
+        if keys is None:
+            return _get_df(session, name, copy)
+
+        return {
+            key: _get_df(session, f"{name}.{pos}", copy) for pos, key in enumerate(keys)
+        }
+
+
+def has(name: str) -> bool:
+    """ist unter dem Namen etwas gespeichert?"""
+    session = _session()
+    with _LOCK:
+        return (session, name) in _ENTRIES
+
+
+def names() -> list:
+    """Namen aller gespeicherten Einträge der Sitzung"""
+    session = _session()
+    with _LOCK:
+        return [name for (ses, name) in _ENTRIES if ses == session]
+
+
+def delete(name: str) -> None:
+    """Eintrag löschen"""
+    session = _session()
+    with _LOCK:
+        keys = _ENTRIES.pop((session, name), None)
+        if isinstance(keys, list):
+            for pos in range(len(keys)):
+                _drop_table(session, f"{name}.{pos}")
+        else:
+            _drop_table(session, name)
+
+
+@dics.timer()
+def cleanup(max_age: int = STORE_MAX_AGE) -> None:
+    """ausgelagerte Dateien von lange nicht benutzten Sitzungen löschen"""
+    if not os.path.isdir(STORE_DIR):
+        return
+
+    for entry in os.scandir(STORE_DIR):
+        if entry.is_dir() and time.time() - entry.stat().st_mtime > max_age:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            with _LOCK:
+                for key in [key for key in _ENTRIES if key[0] == entry.name]:
+                    del _ENTRIES[key]
+                for key in [key for key in _TABLES if key[0] == entry.name]:
+                    del _TABLES[key]
+                for key in [key for key in _COLUMNS if key[0] == entry.name]:
+                    del _COLUMNS[key]
+                for key in [key for key in _FRAMES if key[0] == entry.name]:
+                    del _FRAMES[key]
@@ -12,9 +12,11 @@ import pandas as pd
 import streamlit as st
 
 from modules import def_dics as dics
+from modules import df_manip as dfm
 from modules import excel as ex
 from modules import fig_update_anno as fuan
 from modules import meteorolog as meteo
+from modules import plotly_plots as ploplo
 from modules import user_authentication as uauth
 
 # Aussehen der labels (Überschriften)    {font-size:105%; font-weight:bold; font-style:italic; color:blue;}
@@ -398,6 +400,54 @@ def select_graphs() -> None:
                 st.session_state["but_select_graphs"] = st.form_submit_button("Knöpfle")
 
 
+# Auflösung der Grafiken
+@dics.timer()
+def graph_resolution() -> None:
+    """Ausdünnen großer Datenmengen und Zeitraum des Lastgangs"""
+
+    with st.sidebar:
+        with st.expander("Auflösung der Grafiken", False):
+            with st.form("Auflösung der Grafiken"):
+
+                st.number_input(
+                    label="Punkte je Linie",
+                    min_value=0,
+                    value=ploplo.MAX_POINTS,
+                    step=1000,
+                    format="%i",
+                    help=(
+                        """
+                        Linien mit mehr Punkten werden für die Anzeige ausgedünnt 
+                        (Minimum und Maximum je Abschnitt bleiben erhalten).  \n
+                        _(0 = alle Punkte anzeigen)_
+                        """
+                    ),
+                    key="ni_points",
+                )
+
+                if isinstance(st.session_state["df"].index, pd.DatetimeIndex):
+                    st.date_input(
+                        label="Zeitraum (Lastgang)",
+                        value=(
+                            st.session_state["df"].index.min().date(),
+                            st.session_state["df"].index.max().date(),
+                        ),
+                        min_value=st.session_state["df"].index.min().date(),
+                        max_value=st.session_state["df"].index.max().date(),
+                        help=(
+                            """
+                            Nur dieser Zeitraum wird im Lastgang dargestellt 
+                            - und damit in höherer Auflösung.
+                            """
+                        ),
+                        key="di_range",
+                    )
+
+                st.session_state["but_graph_resolution"] = st.form_submit_button(
+                    "Knöpfle"
+                )
+
+
 @dics.timer()
 def meteo_sidebar(page: str) -> None:
     """sidebar-Menu zur Außentemperatur"""
@@ -514,33 +564,65 @@ def clean_outliers() -> None:
             with st.form("Ausreißerbereinigung"):
 
                 if "abs_max" not in st.session_state:
+                    df = st.session_state["df"]
                     st.session_state["abs_max"] = float(
-                        max(
-                            line["y"].max()
-                            for line in st.session_state["fig_base"].data
-                            if "orgidx" not in line.name
-                        )
+                        df[[col for col in df.columns if "orgidx" not in col]]
+                        .max()
+                        .max()
                     )
 
-                st.number_input(
-                    label="Bereinigung von Werten über:",
-                    value=st.session_state["abs_max"],
-                    format="%.0f",
+                st.selectbox(
+                    label="Methode",
+                    options=dfm.OUTLIER_METHODS,
+                    format_func=lambda method: {
+                        "hampel": "Hampel (gleitender Median)",
+                        "zscore": "z-Wert (gleitender Mittelwert)",
+                        "limit": "Grenzwert",
+                    }[method],
                     help=(
                         """
-                        Ist ein Wert in den Daten höher als der hier eingegebene, 
-                        wird dieser Datenpunkt aus der Reihe gelöscht und die Lücke interpoliert.
+                        Hampel und z-Wert vergleichen jeden Wert mit seiner Umgebung
+                        (Fenster), der Grenzwert gilt für die ganze Reihe.
+                        Ausreißer werden aus der Reihe gelöscht und die Lücke interpoliert.
                         """
                     ),
+                    key="sb_outl_method",
+                )
+
+                st.number_input(
+                    label="Fenster (Stunden)",
+                    min_value=1,
+                    value=24,
+                    key="ni_outl_window",
+                )
+
+                st.number_input(
+                    label="Schwelle (Standardabweichungen)",
+                    min_value=1.0,
+                    value=3.0,
+                    step=0.5,
+                    key="ni_outl_sigma",
+                )
+
+                st.number_input(
+                    label="Grenzwert: Bereinigung von Werten über",
+                    value=st.session_state["abs_max"],
+                    format="%.0f",
                     key="ni_outl",
-                    disabled=True,
                 )
 
+                if st.session_state.get("df_outl_report") is not None:
+                    st.dataframe(st.session_state["df_outl_report"])
+
                 st.markdown("###")
 
                 st.session_state["but_clean_outliers"] = st.form_submit_button(
                     "Knöpfle"
                 )
+                st.session_state["but_reset_outliers"] = st.form_submit_button(
+                    "zurücksetzen",
+                    help="importierte Daten ohne Bereinigung wiederherstellen",
+                )
 
 
 # geglättete Linien
@@ -816,20 +898,18 @@ def downloads(page: str = "graph") -> None:
 
         with st.spinner("Momentle bitte - Excel-Datei wird erzeugt..."):
             if page in ("graph"):
-                dic_df_ex = {
-                    x.name: {
-                        "df": pd.DataFrame(data=x.y, index=x.x, columns=[x.name]),
-                        "unit": st.session_state["dic_meta"][x.name].get("unit_data"),
-                    }
-                    for x in [
-                        d
-                        for d in st.session_state["fig_base"].data
-                        if all(e not in d.name for e in fuan.gv.exclude)
-                    ]
-                }
+                # Linien aus fig_base mit allen Werten
+                # (die Linien in der Grafik sind ausgedünnt)
+                dic_source = fuan.fig_source("fig_base", whole=True)
+                lis_lines = [
+                    d.name
+                    for d in st.session_state["fig_base"].data
+                    if all(e not in d.name for e in fuan.gv.exclude)
+                    and d.name in dic_source
+                ]
 
                 df_ex = st.session_state["df_ex"] = pd.concat(
-                    [dic_df_ex.get(df).get("df") for df in dic_df_ex], axis=1
+                    [dic_source[line][0].rename(line) for line in lis_lines], axis=1
                 )
             if page in ("meteo"):
                 df_ex = st.session_state.get("meteo_data")
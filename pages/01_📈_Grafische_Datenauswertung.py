@@ -4,6 +4,7 @@ Seite Grafische Datenauswertung
 
 import locale
 
+import pandas as pd
 import streamlit as st
 
 from modules import def_dics as dics
@@ -13,6 +14,7 @@ from modules import fig_update_anno as fuan
 from modules import figs
 from modules import global_variables as gv
 from modules import meteorolog as meteo
+from modules import session_store as sst
 from modules import streamlit_menus as sm
 from modules import user_authentication as uauth
 
@@ -66,6 +68,10 @@ if uauth.authentication(PAGE):
                 # Excel-Datei importieren
                 ex.import_prefab_excel(st.session_state["f_up"])
 
+                # Auflösungsstufen für die Grafik
+                if isinstance(st.session_state["df"].index, pd.DatetimeIndex):
+                    dfm.df_pyramid(st.session_state["df"])
+
                 # Einheiten
                 if "all_units" not in st.session_state:
                     dics.units()
@@ -73,12 +79,18 @@ if uauth.authentication(PAGE):
         # Grundeinstellungen in der sidebar
         sm.base_settings()
         if st.session_state.get("but_base_settings"):
-            for entry in ("fig_base", "df_h"):
-                dics.del_session_state_entry(entry)
+            dics.del_session_state_entry("fig_base")
+            sst.delete("df_h")
 
         # anzuzeigende Grafiken
         sm.select_graphs()
 
+        # Auflösung der Grafiken
+        sm.graph_resolution()
+        if st.session_state.get("but_graph_resolution"):
+            for entry in ("fig_base", "fig_jdl"):
+                dics.del_session_state_entry(entry)
+
         # Außentemperatur
         with st.sidebar:
             with st.expander("Außentemperatur", False):
@@ -90,19 +102,38 @@ if uauth.authentication(PAGE):
             else:
                 meteo.del_meteo()
 
+        # Ausreißerbereinigung (abgeleitete dfs und Grafiken werden danach neu erzeugt)
+        sm.clean_outliers()
+        if st.session_state.get("but_clean_outliers"):
+            with st.spinner("Momentle bitte - Ausreißer werden bereinigt..."):
+                dfm.clean_outliers(
+                    method=st.session_state["sb_outl_method"],
+                    window=dfm.outlier_window(
+                        st.session_state["ni_outl_window"],
+                        st.session_state["dic_meta"],
+                    ),
+                    n_sigma=st.session_state["ni_outl_sigma"],
+                    limit=st.session_state["ni_outl"],
+                )
+        if st.session_state.get("but_reset_outliers"):
+            dfm.reset_outliers()
+
         # df mit Stundenwerten erzeugen
-        if st.session_state.get("cb_h") and "df_h" not in st.session_state:
+        if st.session_state.get("cb_h") and not sst.has("df_h"):
             with st.spinner("Momentle bitte - Stundenwerte werden erzeugt..."):
-                st.session_state["df_h"] = dfm.h_from_other(
-                    st.session_state["df"], st.session_state["dic_meta"]
+                sst.put(
+                    "df_h",
+                    dfm.h_from_other(
+                        st.session_state["df"], st.session_state["dic_meta"]
+                    ),
                 )
 
         # df für Tagesvergleich
-        if st.session_state.get("but_select_graphs") and st.session_state.get(
-            "cb_days"
+        if st.session_state.get("cb_days") and (
+            st.session_state.get("but_select_graphs") or not sst.has("dic_days")
         ):
             if st.session_state.get("cb_h"):
-                dfm.dic_days(st.session_state["df_h"])
+                dfm.dic_days(sst.get("df_h"))
             else:
                 dfm.dic_days(st.session_state["df"])
 
@@ -112,30 +143,36 @@ if uauth.authentication(PAGE):
             or st.session_state.get("cb_multi_year") is False
         ):
             # df geordnete Jahresdauerlinie
-            if st.session_state.get("cb_jdl") and "df_jdl" not in st.session_state:
+            if st.session_state.get("cb_jdl") and not sst.has("df_jdl"):
                 with st.spinner("Momentle bitte - Jahresdauerlinie wird erzeugt..."):
-                    if "df_h" not in st.session_state:
-                        st.session_state["df_h"] = dfm.h_from_other(
-                            st.session_state["df"], st.session_state["dic_meta"]
+                    if not sst.has("df_h"):
+                        sst.put(
+                            "df_h",
+                            dfm.h_from_other(
+                                st.session_state["df"], st.session_state["dic_meta"]
+                            ),
                         )
 
-                    dfm.jdl(st.session_state["df_h"])
+                    dfm.jdl(sst.get("df_h"))
 
             # df Monatswerte
-            if st.session_state.get("cb_mon") and "df_mon" not in st.session_state:
+            if st.session_state.get("cb_mon") and not sst.has("df_mon"):
                 with st.spinner("Momentle bitte - Monatswerte werden erzeugt..."):
                     dfm.mon(st.session_state["df"], st.session_state["dic_meta"])
 
         # mehrere Jahre übereinander
         else:
             with st.spinner("Momentle bitte - Werte werden auf Jahre aufgeteilt..."):
-                if "dic_df_multi" not in st.session_state:
+                if not sst.has("dic_df_multi"):
                     dfm.df_multi_y(
-                        st.session_state["df_h"]
+                        sst.get("df_h")
                         if st.session_state.get("cb_h")
                         else st.session_state["df"]
                     )
 
+        # abgeleitete dfs für später angehängte Daten speichern
+        ex.cache_products()
+
         # --- Grafiken erzeugen ---
         # Grund-Grafik
         st.session_state["lis_figs"] = ["fig_base"]
@@ -164,7 +201,11 @@ if uauth.authentication(PAGE):
         # Tagesvergleich
         if st.session_state.get("cb_days"):
             st.session_state["lis_figs"].append("fig_days")
-            if st.session_state.get("but_select_graphs"):
+            if (
+                st.session_state.get("but_select_graphs")
+                or st.session_state.get("but_graph_resolution")
+                or "fig_days" not in st.session_state
+            ):
                 with st.spinner(
                     'Momentle bitte - Grafik "Tagesvergleich" wird erzeugt...'
                 ):
@@ -175,15 +216,10 @@ if uauth.authentication(PAGE):
         if st.session_state.get("but_h_v_lines"):
             fuan.h_v_lines()
 
-        # Ausreißerbereinigung
-        sm.clean_outliers()
-        if st.session_state.get("but_clean_outliers"):
-            fuan.clean_outliers()
-
         # glatte Linien
         sm.smooth()
         if st.session_state.get("but_smooth") and st.session_state.get("cb_smooth"):
-            fuan.smooth()
+            fuan.smooth("fig_base")
         if (
             st.session_state.get("but_smooth")
             and st.session_state.get("cb_smooth") is not True
@@ -241,8 +277,8 @@ if uauth.authentication(PAGE):
                 config=fuan.plotly_config(),
             )
 
-            if "dic_days" in st.session_state:
-                debug_show(st.session_state["dic_days"])
+            if sst.has("dic_days"):
+                debug_show(sst.get("dic_days"))
 
             if "dic_meta" in st.session_state:
                 debug_show(st.session_state["dic_meta"])
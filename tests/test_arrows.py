@@ -0,0 +1,75 @@
+"""
+Tests für fig_update_anno.arrows_min_max (Pfeile an Maxima im Lastgang)
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+
+from modules import fig_update_anno as fuan
+from modules import figs
+from modules import session_store as sst
+
+
+@pytest.fixture
+def session(monkeypatch: pytest.MonkeyPatch, tmp_path) -> pd.DataFrame:
+    """Lastgang über drei Jahre mit der größten Spitze außerhalb von 2018"""
+    monkeypatch.setattr(sst, "STORE_DIR", str(tmp_path))
+    st.session_state.clear()
+
+    index = pd.date_range("2017-01-01 00:15", "2020-01-01", freq="15min")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "Bezug": rng.uniform(10, 50, len(index)),
+            "Einspeisung": rng.uniform(0, 20, len(index)),
+        },
+        index=index,
+    )
+    df.loc["2017-08-15 12:00", "Bezug"] = 500.0
+    df.loc["2018-03-01 12:00", "Bezug"] = 100.0
+    df.loc["2019-03-25 12:00", "Einspeisung"] = 80.0
+    df["orgidx"] = df.index
+
+    dic_meta = {
+        col: {"tit": col, "unit_graph": " kW", "unit_data": " kW", "y_axis": "y"}
+        for col in ("Bezug", "Einspeisung")
+    }
+    dic_meta["index"] = {"td_mean": pd.Timedelta(minutes=15)}
+    st.session_state.update(df=df, dic_meta=dic_meta, lis_years=[2017, 2018, 2019])
+
+    yield df
+
+    st.session_state.clear()
+
+
+def test_arrows_in_range(session: pd.DataFrame) -> None:
+    """Pfeile nur im dargestellten Zeitraum"""
+    st.session_state["di_range"] = (
+        datetime.date(2018, 1, 1),
+        datetime.date(2018, 12, 31),
+    )
+
+    figs.cr_fig_base()
+
+    lis_arrows = st.session_state["fig_base"].layout.annotations
+    assert len(lis_arrows) == 2
+    for arrow in lis_arrows:
+        assert (
+            pd.Timestamp("2018-01-01")
+            <= pd.Timestamp(arrow.x)
+            < pd.Timestamp("2019-01-01")
+        )
+    assert pd.Timestamp(lis_arrows[0].x) == pd.Timestamp("2018-03-01 12:00")
+
+
+def test_arrows_whole(session: pd.DataFrame) -> None:
+    """ohne Auswahl: Spitzen aus allen Daten"""
+    figs.cr_fig_base()
+
+    lis_x = [pd.Timestamp(a.x) for a in st.session_state["fig_base"].layout.annotations]
+    assert pd.Timestamp("2017-08-15 12:00") in lis_x
+    assert pd.Timestamp("2019-03-25 12:00") in lis_x
@@ -0,0 +1,64 @@
+"""
+Tests für df_manip.dls (Zeitumstellung)
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules import df_manip as dfm
+
+
+def local_profile(start: str, end: str, freq: str = "15min") -> pd.DataFrame:
+    """Lastgang mit lokalen Zeitstempeln, wie ihn ein Zähler aufzeichnet
+    (doppelte Stunde bei der Umstellung auf Winterzeit, Lücke bei Sommerzeit)"""
+    index = pd.date_range(
+        start, end, freq=freq, tz=dfm.TZ_LOCAL, inclusive="left"
+    ).tz_localize(None)
+    return pd.DataFrame({"Wert": np.arange(len(index), dtype="float64")}, index=index)
+
+
+def test_fall_back() -> None:
+    """doppelte Stunde wird gelöscht, die erste bleibt"""
+    df = local_profile("2021-10-31 00:00", "2021-10-31 06:00")
+    assert len(df) == 6 * 4 + 4
+
+    df_dls, df_del = dfm.dls(df)
+
+    assert len(df_del) == 4
+    assert (df_del.index.hour == 2).all()
+    assert df_dls.index.is_unique
+    assert df_dls.index.is_monotonic_increasing
+    assert df_dls.loc["2021-10-31 02:00", "Wert"] == df["Wert"].iloc[8]
+
+
+def test_spring_forward() -> None:
+    """fehlende Stunde bei der Umstellung auf Sommerzeit bleibt eine Lücke"""
+    df = local_profile("2021-03-28 00:00", "2021-03-28 06:00")
+    assert len(df) == 6 * 4 - 4
+
+    df_dls, df_del = dfm.dls(df)
+
+    assert df_del.empty
+    assert df_dls.equals(df)
+
+
+def test_multi_year() -> None:
+    """mehrere Jahre in einem Durchgang"""
+    df = local_profile("2019-01-01", "2022-01-01")
+
+    df_dls, df_del = dfm.dls(df)
+
+    assert len(df_del) == 3 * 4
+    assert sorted(set(df_del.index.year)) == [2019, 2020, 2021]
+    assert df_dls.index.is_unique
+    assert len(df_dls) == len(df) - 3 * 4
+
+
+def test_localize() -> None:
+    """Index mit Zeitzone"""
+    df = local_profile("2021-10-31 00:00", "2021-10-31 06:00")
+
+    df_dls, _ = dfm.dls(df, localize=True)
+
+    assert str(df_dls.index.tz) == dfm.TZ_LOCAL
+    assert df_dls.index.is_unique
@@ -0,0 +1,36 @@
+"""
+Tests für df_manip.repair_12h (12-Stunden-Uhr ohne vormittags / nachmittags)
+"""
+
+import pandas as pd
+
+from modules import df_manip as dfm
+
+
+def export_12h(day: str) -> pd.DataFrame:
+    """Zählerexport eines Tages mit Uhrzeiten 0 bis 11 Uhr, zweimal"""
+    stamps = pd.date_range(day, periods=24, freq="h")
+    return pd.DataFrame(
+        {"Zeit": stamps - pd.to_timedelta((stamps.hour >= 12) * 12, unit="h")}
+    )
+
+
+def test_repair() -> None:
+    """zweite Tageshälfte bekommt 12 Stunden dazu"""
+    dic_df, lis_corrected = dfm.repair_12h({"a": export_12h("2021-01-01")})
+
+    assert lis_corrected == ["a"]
+    assert (dic_df["a"]["Zeit"].dt.hour.to_numpy() == range(24)).all()
+
+
+def test_empty_frames() -> None:
+    """leere dfs (auch als letztes) bleiben leer, die anderen werden korrigiert"""
+    df = export_12h("2021-01-01")
+    dic_df, lis_corrected = dfm.repair_12h(
+        {"leer": df.iloc[:0], "a": df, "b": export_12h("2021-01-02").iloc[:0]}
+    )
+
+    assert lis_corrected == ["a"]
+    assert dic_df["leer"].empty
+    assert dic_df["b"].empty
+    assert (dic_df["a"]["Zeit"].dt.hour.to_numpy() == range(24)).all()